@@ -0,0 +1,41 @@
+""" The node and time budgets of the MCTS search loops.
+
+A search samples games until it has played node_budget of them or until the
+iterations up to its next clock check, at the rate so far, would run past
+time_budget seconds. The clock is read after the first iteration and then every
+clock_interval iterations, so the first iteration always runs and a budget
+shorter than one iteration gets exactly one.
+"""
+
+from time import perf_counter
+
+
+class SearchBudget:
+    """ Counts the iterations of a search loop and tells it when its budget runs out:
+
+        budget = SearchBudget(node_budget, time_budget, clock_interval)
+        while budget.next_iteration():
+            ...
+        return budget.iterations
+    """
+
+    def __init__(self, node_budget: int = None, time_budget: float = None, clock_interval: int = 8):
+        self.node_budget = node_budget          # The most iterations, or None for no limit
+        self.time_budget = time_budget          # The most seconds, or None for no limit
+        self.clock_interval = clock_interval    # Iterations between clock checks after the first
+        self.iterations = 0
+        self.start = perf_counter()
+
+    def next_iteration(self):
+        """ Returns whether another iteration fits in the budget, counting it if so. """
+        iterations = self.iterations
+        if self.node_budget is not None and iterations >= self.node_budget:
+            return False
+        if self.time_budget is not None and iterations and (iterations == 1 or iterations % self.clock_interval == 0):
+            elapsed = perf_counter() - self.start
+            # Stop if the iterations up to the next clock check, at the rate so far, would run over.
+            ahead = self.clock_interval - iterations % self.clock_interval
+            if elapsed + elapsed / iterations * ahead >= self.time_budget:
+                return False
+        self.iterations = iterations + 1
+        return True
@@ -1,11 +1,22 @@
 
+import logging
 from mcts_node import MCTSNode
+from mcts_budget import SearchBudget
+from mcts_ucb import select_child
 from p2_t3 import Board
-from random import choice
-from math import sqrt, log
+from random import randrange
+from time import perf_counter
+from mcts_profile import Profiler
+import mcts_parallel
+import p2_telemetry
 
 num_nodes = 1000
 explore_faction = 2
+clock_interval = 8  # Iterations between clock checks when searching to a time budget
+root_workers = 4    # Worker processes, and so trees, for think_root_parallel
+expansion_order = 'random'  # Order of expansion: 'fixed' (legal_actions order) or 'random'
+
+logger = logging.getLogger(__name__)
 
 def traverse_nodes(node: MCTSNode, board: Board, state, bot_identity: int):
     """ Traverses the tree until the end criterion are met.
@@ -30,22 +41,11 @@ def traverse_nodes(node: MCTSNode, board: Board, state, bot_identity: int):
     current_game = state
     current_board = board
     current_identity = bot_identity
-    while starter.untried_actions == [] and current_board.is_ended(current_game) != True:
-        uct_val = -1000000000
-        chosen_node = None
-        chosen_move = None
+    # Terminal nodes are created with no untried actions and never get children.
+    while starter.next_action == len(starter.actions) and starter.children:
         # Finding the node with the maximum UCT
-        for instances in starter.child_nodes.keys():
-            #print("Current Stats: ", starter.child_nodes[instances].parent.visits, starter.child_nodes[instances].wins, starter.child_nodes[instances].visits)
-            #print("Current UCT: ", ucb(starter.child_nodes[instances], (bot_identity != 1)))
-            #print()
-            if ucb(starter.child_nodes[instances], (current_identity != bot_identity)) > uct_val:
-                uct_val = ucb(starter.child_nodes[instances], (current_identity != bot_identity))
-                chosen_node = starter.child_nodes[instances]
-                chosen_move = instances
-        
-        starter = chosen_node
-        current_game = current_board.next_state(current_game, chosen_move)
+        starter = select_child(starter, current_identity != bot_identity, explore_faction)
+        current_game = current_board.next_state(current_game, starter.parent_action)
         current_identity = (1 if current_identity == 2 else 2)
 
     return starter, current_game
@@ -65,43 +65,26 @@ def expand_leaf(node: MCTSNode, board: Board, state):
     """
     current_board = board
     current_game = state
-    if current_board.is_ended(current_game) == True:
+    if node.next_action == len(node.actions):
+        # A terminal node: nothing left to expand.
         return node, state
 
 
-    move_chosen = node.untried_actions[0]
-    node.untried_actions.pop(0)
+    if expansion_order == 'random':
+        # Swap a random untried action to the front of the untried ones.
+        actions, i, j = node.actions, node.next_action, randrange(node.next_action, len(node.actions))
+        actions[i], actions[j] = actions[j], actions[i]
+    move_chosen = node.actions[node.next_action]
+    node.next_action += 1
 
     current_game = current_board.next_state(current_game, move_chosen)
-    new_node = MCTSNode(parent = node, parent_action = move_chosen, action_list = current_board.legal_actions(current_game))
-
-    node.child_nodes[move_chosen] = new_node
+    action_list = [] if current_board.is_ended(current_game) else current_board.legal_actions(current_game)
+    new_node = node.add_child(move_chosen, action_list)
     return new_node, current_game
 
-def heuristic(board: Board, state, moves, bot_identity):
-    current_state = state
-    next_state = None
-    move_chosen = None
-    for instances in moves:
-        next_state = board.next_state(current_state, instances)
-        avail_prev = board.owned_boxes(current_state)
-        avail_next = board.owned_boxes(next_state)
-        for mini in avail_prev.keys():
-            if bot_identity == 1 and avail_prev[mini] != avail_next[mini] and avail_next[mini] == 1:
-                #if you can win a box with the move, you should take it
-                move_chosen = instances
-                return move_chosen
-            if bot_identity == 2 and avail_prev[mini] != avail_next[mini] and avail_next[mini] == 2:
-                #if you can win a box with the move, you should take it
-                #print("AHHHHH")
-                #print(board.display(current_state, instances))
-                #print(board.display(next_state, instances))
-                move_chosen = instances
-                return move_chosen
-    return move_chosen
-
-def rollout(board: Board, state, bot_identity):
-    """ Given the state of the game, the rollout plays out the remainder randomly.
+def rollout(board: Board, state):
+    """ Given the state of the game, the rollout plays out the remainder, taking a move that wins a
+    sub-board for the player to move whenever there is one and a random move otherwise.
 
     Args:
         board:  The game setup.
@@ -111,55 +94,34 @@ def rollout(board: Board, state, bot_identity):
         state: The terminal game state
 
     """
-    current_board = board
-    current_game = state
-    starter = 0 
-    while current_board.is_ended(current_game) != True:
-        #print("move count: ", starter)
-        starter += 1
-        move_chosen = heuristic(board, state, current_board.legal_actions(current_game), bot_identity)
-        if move_chosen == None:
-            move_chosen = choice(current_board.legal_actions(current_game))
-        current_game = current_board.next_state(current_game, move_chosen)
-        #print("finished game state")
-        #print(board.display(current_game, move_chosen))
-    return current_game
-
-
-def backpropagate(node: MCTSNode|None, won: bool):
-    """ Navigates the tree from a leaf node to the root, updating the win and visit count of each node along the path.
+    return board.random_playout(state, greedy=True)
 
-    Args:
-        node:   A leaf node.
-        won:    An indicator of whether the bot won or lost the game.
+
+def simulate(board: Board, state, bot_identity: int):
+    """ Plays one rollout from a new leaf.
+
+    Returns:    The games won by the bot, with draws counted as half a win, and the games played
 
     """
-    node.visits += 1
-    if node.parent == None: 
-        return
-    node.wins += won
-    backpropagate(node.parent, won)
+    return is_win(board, rollout(board, state), bot_identity), 1
 
-def ucb(node: MCTSNode, is_opponent: bool):
-    """ Calcualtes the UCB value for the given node from the perspective of the bot
+
+def backpropagate(node: MCTSNode|None, won: float, visits: int = 1):
+    """ Navigates the tree from a leaf node to the root, updating the win and visit count of each node along the path.
+    The path is followed through the parent links that traverse_nodes and expand_leaf descended, so the walk
+    neither recurses nor allocates.
 
     Args:
-        node:   A node.
-        is_opponent: A boolean indicating whether or not the last action was performed by the MCTS bot
-    Returns:
-        The value of the UCB function for the given node
+        node:   A leaf node.
+        won:    The games won by the bot out of visits, with draws counted as half a win.
+        visits: The number of games played from the leaf.
+
     """
-    if node.parent == None:
-        # root node
-        return -1 
-    natural_log = log(node.parent.visits) / log(2.71828)
-    exploit = None
-    if is_opponent:
-        exploit = 1 - (node.wins / node.visits)
-    else:
-        exploit = (node.wins / node.visits)
-    explore = explore_faction * sqrt(natural_log / node.visits)
-    return exploit + explore
+    while node.parent is not None:
+        node.visits += visits
+        node.wins += won
+        node = node.parent
+    node.visits += visits
 
 def get_best_action(root_node: MCTSNode):
     """ Selects the best action from the root node in the MCTS tree
@@ -174,53 +136,104 @@ def get_best_action(root_node: MCTSNode):
     visit = -1
     chosen_move = None
     # Finding the node with the maximum UCT
-    for instances in root_node.child_nodes.keys():
-        if root_node.child_nodes[instances].wins / root_node.child_nodes[instances].visits > val:
-            if root_node.child_nodes[instances].visits > visit:
-                val = root_node.child_nodes[instances].wins / root_node.child_nodes[instances].visits
-                visit = root_node.child_nodes[instances].visits
-                chosen_move = instances
+    for child in root_node.children or ():
+        if child.wins / child.visits > val:
+            if child.visits > visit:
+                val = child.wins / child.visits
+                visit = child.visits
+                chosen_move = child.parent_action
     return chosen_move
 
 def is_win(board: Board, state, identity_of_bot: int):
-    # checks if state is a win state for identity_of_bot
-    outcome = board.points_values(state)
+    # scores a terminal state for identity_of_bot: 1 for a win, 0.5 for a draw and 0 for a loss
+    outcome = board.win_values(state)
     assert outcome is not None, "is_win was called on a non-terminal state"
-    return outcome[identity_of_bot] == 1
+    return outcome[identity_of_bot]
 
-def think(board: Board, current_state):
+def search(board: Board, current_state, node_budget: int = None, time_budget: float = None,
+           profiler: Profiler = None):
     """ Performs MCTS by sampling games and calling the appropriate functions to construct the game tree.
 
     Args:
         board:  The game setup.
         current_state:  The current state of the game.
+        node_budget:  The most games to sample, or None for no limit.
+        time_budget:  The most seconds to search for, or None for no limit.
+        profiler:  A Profiler to add the time of each phase to, or None.
 
-    Returns:    The action to be taken from the current state
+    Returns:    The root node of the tree and the number of games sampled
 
     """
     bot_identity = board.current_player(current_state) # 1 or 2
     root_node = MCTSNode(parent=None, parent_action=None, action_list=board.legal_actions(current_state))
+    select, expand, play, update = traverse_nodes, expand_leaf, simulate, backpropagate
+    if profiler is not None:
+        select, expand, play, update = profiler.timed_phases(select, expand, play, update)
+    budget = SearchBudget(node_budget, time_budget, clock_interval)
+    while budget.next_iteration():
+        node, state = select(root_node, board, current_state, bot_identity)
+        node, state = expand(node, board, state)
+        won, visits = play(board, state, bot_identity)
+        update(node, won, visits)
+    return root_node, budget.iterations
+
+def think(board: Board, current_state, time_budget: float = None, node_budget: int = None,
+          profiler: Profiler = None):
+    """ Performs MCTS by sampling games and calling the appropriate functions to construct the game tree.
+    The search stops at whichever budget runs out first; with neither given it samples num_nodes games.
+
+    Args:
+        board:  The game setup.
+        current_state:  The current state of the game.
+        time_budget:  The most seconds to search for.
+        node_budget:  The most games to sample.
+        profiler:  A Profiler to add the time of each phase of the search to, or None.
 
-    for _ in range(num_nodes):
-        #print("current iteration: ", starters)
-        #starters += 1
-        state = current_state
-        node = root_node
-        
-        node, state = traverse_nodes(node, board, state, bot_identity)
-        #print(node, state)
-        #print("legal moves: ", node.untried_actions)
-        node, state = expand_leaf(node, board, state)
-        state = rollout(board, state, bot_identity)
-        backpropagate(node, is_win(board, state, bot_identity))
-        #print(node.tree_to_string(horizon=3))
-        #print(node, state)
-        #print(node)
-        #print("legal moves: ", node.untried_actions)
+    Returns:    The action to be taken from the current state
+
+    """
+    if time_budget is None and node_budget is None:
+        node_budget = num_nodes
+    move_profiler = Profiler() if profiler is not None or p2_telemetry.enabled() else None
+    start = perf_counter()
+    root_node, iterations = search(board, current_state, node_budget, time_budget, move_profiler)
+    wall_time = perf_counter() - start
+    if profiler is not None:
+        profiler.merge(move_profiler)
+    logger.info("Iterations done: %d in %.3f s", iterations, wall_time)
 
     # Return an action, typically the most frequently used action (from the root) or the action with the best
     # estimated win rate.
     best_action = get_best_action(root_node)
+    report(root_node, wall_time, iterations, move_profiler)
     
-    print(f"Action chosen: {best_action}")
+    logger.info("Action chosen: %s", best_action)
+    return best_action
+
+def report(root_node: MCTSNode, wall_time: float, iterations: int, profiler: Profiler = None):
+    """ Reports a move searched with the given tree, and profiled by profiler if given, to p2_telemetry,
+    if it is on. """
+    if p2_telemetry.enabled():
+        nodes, depth = p2_telemetry.tree_shape(root_node)
+        phases = profiler.seconds() if profiler is not None else None
+        p2_telemetry.report(__name__, nodes=nodes, depth=depth,
+                            **p2_telemetry.search_fields(wall_time, iterations, phases=phases))
+
+def think_root_parallel(board: Board, current_state):
+    """ Performs MCTS with root_workers independent trees built in worker processes, each with
+    num_nodes / root_workers iterations, and picks the action from their merged root statistics.
+
+    Args:
+        board:  The game setup.
+        current_state:  The current state of the game.
+
+    Returns:    The action to be taken from the current state
+
+    """
+    start = perf_counter()
+    root_node = mcts_parallel.root_parallel(__name__, board, current_state, num_nodes, root_workers)
+    best_action = get_best_action(root_node)
+    report(root_node, perf_counter() - start, num_nodes)
+
+    logger.info("Action chosen: %s", best_action)
     return best_action
@@ -1,25 +1,56 @@
 
 
 class MCTSNode:
-    def __init__(self, parent=None, parent_action=None, action_list=[]):
+    __slots__ = ('parent', 'parent_action', 'children', 'actions', 'next_action', 'wins', 'visits')
+
+    def __init__(self, parent=None, parent_action=None, action_list=None):
         """ Initializes the tree node for MCTS. The node stores links to other nodes in the tree (parent and child
         nodes), as well as keeps track of the number of wins and total simulations that have visited the node.
 
         Args:
             parent:         The parent node of this node.
             parent_action:  The action taken from the parent node that transitions the state to this node.
-            action_list:    The list of legal actions to be considered at this node.
+            action_list:    The list of legal actions to be considered at this node. The node keeps this list
+                            rather than a copy of it.
 
         """
         self.parent = parent                    # Parent node to this node
         self.parent_action = parent_action      # The move that got us to this node - "None" for the root node.
 
-        self.child_nodes = {}                   # Action -> MCTSNode dictionary of children
-        self.untried_actions = action_list      # Yet unexplored actions
+        self.children = None                    # Child nodes in the order they were added; a list from the first one
+        self.actions = action_list if action_list is not None else []
+        self.next_action = 0                    # Yet unexplored actions are actions[next_action:]
 
         self.wins = 0                           # Total wins of all paths through this node.
         self.visits = 0                         # Number of times this node has been visited.
 
+    @property
+    def untried_actions(self):
+        """ A new list of the actions not expanded yet. """
+        return self.actions[self.next_action:]
+
+    @property
+    def child_nodes(self):
+        """ A new action -> MCTSNode dictionary of the children. """
+        return dict((child.parent_action, child) for child in self.children or ())
+
+    def add_child(self, action, action_list):
+        """ Creates the child node reached by the given action, adds it to this node's children and returns it.
+
+        Args:
+            action:         The action that transitions the state of this node to the child.
+            action_list:    The list of legal actions to be considered at the child.
+
+        Returns:            The new child node.
+
+        """
+        child = MCTSNode(parent=self, parent_action=action, action_list=action_list)
+        if self.children is None:
+            self.children = [child]
+        else:
+            self.children.append(child)
+        return child
+
     def __repr__(self):
         """
         This method provides a string representing the node. Any time str(node) is used, this method is called.
@@ -40,6 +71,6 @@ class MCTSNode:
         """
         string = ''.join(['| ' for i in range(indent)]) + str(self) + '\n'
         if horizon > 0:
-            for child in self.child_nodes.values():
+            for child in self.children or ():
                 string += child.tree_to_string(horizon - 1, indent + 1)
         return string
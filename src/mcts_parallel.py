@@ -0,0 +1,164 @@
+""" Process-pool and thread helpers shared by the MCTS bots.
+
+The pool is created on first use and kept alive between calls to think, so the
+cost of starting the workers is paid once per process rather than once per move.
+
+tree_parallel runs its workers as threads of this process, which share the tree
+as ordinary MCTSNode objects. They also share the interpreter lock, so with the
+pure-Python rollouts only one of them runs at a time: it shows what virtual loss
+does to the shape of the tree, but it is no faster than search.
+"""
+
+import random
+import importlib
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from mcts_node import MCTSNode
+
+_pool = None
+_pool_workers = 0
+
+
+def get_pool(workers: int):
+    """ Returns a process pool with the given number of workers, reusing the current one if it matches. """
+    global _pool, _pool_workers
+    if _pool is None or _pool_workers != workers:
+        shutdown_pool()
+        _pool = ProcessPoolExecutor(max_workers=workers)
+        _pool_workers = workers
+    return _pool
+
+
+def shutdown_pool():
+    """ Stops the worker processes, if any. """
+    global _pool, _pool_workers
+    if _pool is not None:
+        _pool.shutdown()
+    _pool = None
+    _pool_workers = 0
+
+
+def rollout_wins(board, state, identity: int, count: int, seed: int):
+    """ Plays count random games from state and returns how many identity won, counting draws as half a win. """
+    rng = random.Random(seed)
+    won = 0.0
+    for _ in range(count):
+        won += board.win_values(board.random_playout(state, rng))[identity]
+    return won
+
+
+def leaf_rollouts(board, state, identity: int, count: int, workers: int):
+    """ Plays count random games from state, split across the given number of worker processes
+    (in this process when workers is 0), and returns how many identity won, counting draws as half a win.
+
+    The chunk seeds are drawn from the random module, so seeding it reproduces the result.
+    """
+    chunks = max(1, min(workers, count))
+    sizes = [count // chunks + (i < count % chunks) for i in range(chunks)]
+    seeds = [random.getrandbits(32) for _ in sizes]
+    if not workers:
+        return sum(rollout_wins(board, state, identity, size, seed) for size, seed in zip(sizes, seeds))
+
+    pool = get_pool(workers)
+    futures = [pool.submit(rollout_wins, board, state, identity, size, seed) for size, seed in zip(sizes, seeds)]
+    return sum(future.result() for future in futures)
+
+
+def search_tree(module_name: str, board, state, iterations: int, seed: int):
+    """ Builds one tree with the search function of the named MCTS module and returns the
+    (action, wins, visits) of each child of its root. """
+    module = importlib.import_module(module_name)
+    random.seed(seed)
+    if getattr(module, 'workers', 0):
+        # This already runs in a worker; play any leaf rollouts here.
+        module.workers = 0
+    root_node, _ = module.search(board, state, iterations)
+    return [(child.parent_action, child.wins, child.visits) for child in root_node.children or ()]
+
+
+def root_parallel(module_name: str, board, state, iterations: int, workers: int):
+    """ Builds workers independent trees from state in worker processes, splitting the iterations
+    between them, and returns a root node holding the merged statistics of their root children.
+
+    The tree seeds are drawn from the random module, so seeding it reproduces the result.
+    """
+    sizes = [iterations // workers + (i < iterations % workers) for i in range(workers)]
+    seeds = [random.getrandbits(32) for _ in sizes]
+    pool = get_pool(workers)
+    futures = [pool.submit(search_tree, module_name, board, state, size, seed) for size, seed in zip(sizes, seeds)]
+
+    root_node = MCTSNode(parent=None, parent_action=None, action_list=[])
+    children = {}
+    for future in futures:
+        for action, wins, visits in future.result():
+            child = children.get(action)
+            if child is None:
+                child = children[action] = root_node.add_child(action, [])
+            child.wins += wins
+            child.visits += visits
+            root_node.visits += visits
+    return root_node
+
+
+def apply_virtual_loss(node: MCTSNode, amount: int):
+    """ Adds amount lost games to every node from node up to the root, counted as losses for the
+    player who chose each node, so other workers prefer different paths while the rollout runs.
+    A negative amount takes them back off.
+    """
+    path = []
+    while node is not None:
+        path.append(node)
+        node = node.parent
+    for depth, node in enumerate(reversed(path)):
+        node.visits += amount
+        if depth and depth % 2 == 0:
+            # The opponent chose this node, so a loss for them is a win for the bot.
+            node.wins += amount
+
+
+def tree_parallel(module_name: str, board, state, iterations: int, threads: int, virtual_loss: int = 1):
+    """ Runs iterations of the named MCTS module with the given number of threads descending one
+    shared tree, and returns its root node.
+
+    The tree is changed only under a lock: each worker selects and expands a leaf, puts a virtual
+    loss on its path, plays the rollouts outside the lock and then swaps the virtual loss for the
+    real result. With one thread the tree is the same as the module's search builds for the
+    same number of iterations. If a worker raises, the others stop and the first error is raised
+    here once they have.
+    """
+    module = importlib.import_module(module_name)
+    bot_identity = board.current_player(state)
+    root_node = MCTSNode(parent=None, parent_action=None, action_list=module.new_action_list(board, state))
+    lock = threading.Lock()
+    remaining = [iterations]
+    errors = []
+
+    def work():
+        try:
+            while True:
+                with lock:
+                    if not remaining[0]:
+                        return
+                    remaining[0] -= 1
+                    node, leaf_state = module.traverse_nodes(root_node, board, state, bot_identity)
+                    node, leaf_state = module.expand_leaf(node, board, leaf_state)
+                    apply_virtual_loss(node, virtual_loss)
+
+                won, visits = module.simulate(board, leaf_state, bot_identity)
+
+                with lock:
+                    apply_virtual_loss(node, -virtual_loss)
+                    module.backpropagate(node, won, visits)
+        except BaseException as error:
+            with lock:
+                errors.append(error)
+                remaining[0] = 0
+
+    workers = [threading.Thread(target=work) for _ in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    if errors:
+        raise errors[0]
+    return root_node
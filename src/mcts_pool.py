@@ -0,0 +1,315 @@
+""" MCTS over an array-backed tree.
+
+Nodes are integer indices into the parallel columns of a NodePool rather than
+MCTSNode objects. The children of a node take one contiguous block of rows,
+reserved the first time the node is expanded, with one row per legal action in
+the order Board.legal_actions lists them. Expanding the node fills the next row
+of the block, so with the same expansion_order the search builds the same tree
+as mcts_vanilla.
+"""
+
+import logging
+from array import array
+from random import randrange
+try:
+    import numpy as np
+except ImportError:
+    np = None
+from time import perf_counter
+from mcts_node import MCTSNode
+from mcts_budget import SearchBudget
+from mcts_ucb import sqrt_log, inv_sqrt, grow
+from p2_t3 import Board
+from p2_t3_tables import actions
+import mcts_vanilla
+import p2_telemetry
+
+num_nodes = 1000
+explore_faction = 2
+clock_interval = 8  # Iterations between clock checks when searching to a time budget
+expansion_order = 'random'  # Order of expansion: 'fixed' (legal_actions order) or 'random'
+vector_width = 48   # Nodes with at least this many children are scored with NumPy, when it is installed
+
+ROOT_ACTION = 255   # Action code of the root, which no action leads to
+
+logger = logging.getLogger(__name__)
+
+
+def action_code(action):
+    """ Returns the code 9 * (3 * R + C) + 3 * r + c of the action (R, C, r, c). """
+    R, C, r, c = action
+    return 27 * R + 9 * C + 3 * r + c
+
+
+class NodePool:
+    """ The nodes of one search tree as parallel columns indexed by node number; node 0 is the root. """
+
+    def __init__(self):
+        self.parent = array('i', [-1])          # Index of the parent node, -1 for the root
+        self.first_child = array('i', [-1])     # Index of the first row of the children block, -1 until reserved
+        self.block_size = array('B', [0])       # Number of legal actions, so rows, in the children block
+        self.child_count = array('B', [0])      # Number of rows of the block expanded so far
+        self.action = array('B', [ROOT_ACTION]) # Code of the action that leads to the node
+        self.wins = array('d', [0])             # Total wins of all paths through the node
+        self.visits = array('q', [0])           # Number of times the node has been visited
+
+    def __len__(self):
+        return len(self.parent)
+
+    def nbytes(self):
+        """ Returns the bytes held by the columns. """
+        return sum(column.itemsize * len(column) for column in (
+            self.parent, self.first_child, self.block_size, self.child_count, self.action, self.wins, self.visits))
+
+    def reserve_children(self, node: int, action_list):
+        """ Adds one unexpanded row per action as the children block of node. """
+        n = len(action_list)
+        self.first_child[node] = len(self.parent)
+        self.block_size[node] = n
+        self.parent.extend([node] * n)
+        self.first_child.extend([-1] * n)
+        self.block_size.extend(bytes(n))
+        self.child_count.extend(bytes(n))
+        self.action.extend(action_code(action) for action in action_list)
+        self.wins.extend([0.0] * n)
+        self.visits.extend([0] * n)
+
+
+def traverse_nodes(pool: NodePool, board: Board, state, bot_identity: int):
+    """ Traverses the tree until the end criterion are met.
+    e.g. find the best expandable node (node with untried action) if it exist,
+    or else a terminal node
+
+    Args:
+        pool:       The tree.
+        board:      The game setup.
+        state:      The state of the game at the root.
+        identity:   The bot's identity, either 1 or 2
+
+    Returns:
+        node: A node from which the next stage of the search can proceed.
+        state: The state associated with that node
+
+    """
+    first_child, block_size, child_count = pool.first_child, pool.block_size, pool.child_count
+    vectorize = np is not None
+    node = 0
+    is_opponent = False
+    # Nodes whose block is not reserved yet have untried actions; terminal nodes have an empty block.
+    while first_child[node] >= 0 and child_count[node] == block_size[node] and block_size[node]:
+        if vectorize and child_count[node] >= vector_width:
+            node = select_vector(pool, node, is_opponent)
+        else:
+            node = select_scalar(pool, node, is_opponent)
+        state = board.next_state(state, actions[pool.action[node]])
+        is_opponent = not is_opponent
+    return node, state
+
+
+def select_scalar(pool: NodePool, node: int, is_opponent: bool):
+    """ Returns the expanded child of node with the highest UCB value, the first of them on ties. """
+    wins, visits = pool.wins, pool.visits
+    if visits[node] >= len(sqrt_log):
+        grow(visits[node])
+    explore = explore_faction * sqrt_log[visits[node]]
+    best_value = -1000000000
+    chosen = -1
+    first = pool.first_child[node]
+    for child in range(first, first + pool.child_count[node]):
+        exploit = wins[child] / visits[child]
+        if is_opponent:
+            exploit = 1 - exploit
+        value = exploit + explore * inv_sqrt[visits[child]]
+        if value > best_value:
+            best_value = value
+            chosen = child
+    return chosen
+
+
+_inv_sqrt_array = None
+
+
+def select_vector(pool: NodePool, node: int, is_opponent: bool):
+    """ Does what select_scalar does with one NumPy expression over the wins and visits of the children,
+    with the same arithmetic, so both pick the same child. """
+    global _inv_sqrt_array
+    visits = pool.visits
+    if visits[node] >= len(sqrt_log):
+        grow(visits[node])
+    if _inv_sqrt_array is None or len(_inv_sqrt_array) != len(inv_sqrt):
+        _inv_sqrt_array = np.array(inv_sqrt)
+    explore = explore_faction * sqrt_log[visits[node]]
+
+    first = pool.first_child[node]
+    count = pool.child_count[node]
+    # Views on the columns, dropped before the columns next grow.
+    child_wins = np.frombuffer(pool.wins, dtype=np.float64, count=count, offset=8 * first)
+    child_visits = np.frombuffer(visits, dtype=np.int64, count=count, offset=8 * first)
+    exploit = child_wins / child_visits
+    if is_opponent:
+        exploit = 1 - exploit
+    return first + int(np.argmax(exploit + explore * _inv_sqrt_array[child_visits]))
+
+
+def expand_leaf(pool: NodePool, node: int, board: Board, state):
+    """ Adds a new leaf to the tree by expanding the next untried action of the given node (if it is non-terminal).
+
+    Args:
+        pool:   The tree.
+        node:   The node for which a child will be added.
+        board:  The game setup.
+        state:  The state of the game.
+
+    Returns:
+        node: The added child node
+        state: The state associated with that node
+
+    """
+    if pool.first_child[node] < 0:
+        pool.reserve_children(node, [] if board.is_ended(state) else board.legal_actions(state))
+    expanded = pool.child_count[node]
+    if expanded == pool.block_size[node]:
+        # A terminal node: nothing left to expand.
+        return node, state
+
+    pool.child_count[node] = expanded + 1
+    child = pool.first_child[node] + expanded
+    if expansion_order == 'random':
+        # Swap the action of a random unexpanded row into the row being expanded.
+        other = pool.first_child[node] + randrange(expanded, pool.block_size[node])
+        pool.action[child], pool.action[other] = pool.action[other], pool.action[child]
+    return child, board.next_state(state, actions[pool.action[child]])
+
+
+def rollout(board: Board, state):
+    """ Given the state of the game, the rollout plays out the remainder randomly.
+
+    Args:
+        board:  The game setup.
+        state:  The state of the game.
+
+    Returns:
+        state: The terminal game state
+
+    """
+    return board.random_playout(state)
+
+
+def backpropagate(pool: NodePool, node: int, won: float, visits: int = 1):
+    """ Navigates the tree from a leaf node to the root, updating the win and visit count of each node along the path.
+
+    Args:
+        pool:   The tree.
+        node:   A leaf node.
+        won:    The games won by the bot out of visits, with draws counted as half a win.
+        visits: The number of games played from the leaf.
+
+    """
+    parent, node_wins, node_visits = pool.parent, pool.wins, pool.visits
+    while True:
+        node_visits[node] += visits
+        if parent[node] < 0:
+            return
+        node_wins[node] += won
+        node = parent[node]
+
+
+def to_mcts_node(pool: NodePool, node: int = 0, horizon: int = None, copy: MCTSNode = None):
+    """ Copies the subtree under node, down to horizon levels (or all of it), into MCTSNode objects so that
+    MCTSNode.tree_to_string and mcts_vanilla.get_best_action can be used on it. """
+    if copy is None:
+        copy = MCTSNode(parent=None, parent_action=None, action_list=[])
+    copy.wins = pool.wins[node]
+    copy.visits = pool.visits[node]
+
+    first = pool.first_child[node]
+    if first >= 0:
+        expanded = pool.child_count[node]
+        copy.actions = [actions[pool.action[child]] for child in range(first, first + pool.block_size[node])]
+        copy.next_action = expanded
+        if horizon is None or horizon > 0:
+            for child in range(first, first + expanded):
+                to_mcts_node(pool, child, None if horizon is None else horizon - 1,
+                             copy.add_child(actions[pool.action[child]], []))
+    return copy
+
+
+def tree_shape(pool: NodePool):
+    """ Returns the number of expanded nodes in the tree and the depth of the deepest below the root. """
+    nodes = 0
+    depth = 0
+    stack = [(0, 0)]
+    while stack:
+        node, level = stack.pop()
+        nodes += 1
+        if level > depth:
+            depth = level
+        first = pool.first_child[node]
+        if first >= 0:
+            stack.extend((child, level + 1) for child in range(first, first + pool.child_count[node]))
+    return nodes, depth
+
+
+def get_best_action(pool: NodePool):
+    """ Selects the best action from the root node of the tree, as mcts_vanilla.get_best_action does. """
+    return mcts_vanilla.get_best_action(to_mcts_node(pool, 0, horizon=1))
+
+
+def is_win(board: Board, state, identity_of_bot: int):
+    # scores a terminal state for identity_of_bot: 1 for a win, 0.5 for a draw and 0 for a loss
+    outcome = board.win_values(state)
+    assert outcome is not None, "is_win was called on a non-terminal state"
+    return outcome[identity_of_bot]
+
+
+def search(board: Board, current_state, node_budget: int = None, time_budget: float = None):
+    """ Performs MCTS by sampling games and calling the appropriate functions to construct the game tree.
+
+    Args:
+        board:  The game setup.
+        current_state:  The current state of the game.
+        node_budget:  The most games to sample, or None for no limit.
+        time_budget:  The most seconds to search for, or None for no limit.
+
+    Returns:    The tree and the number of games sampled
+
+    """
+    bot_identity = board.current_player(current_state) # 1 or 2
+    pool = NodePool()
+    budget = SearchBudget(node_budget, time_budget, clock_interval)
+    while budget.next_iteration():
+        node, state = traverse_nodes(pool, board, current_state, bot_identity)
+        node, state = expand_leaf(pool, node, board, state)
+        state = rollout(board, state)
+        backpropagate(pool, node, is_win(board, state, bot_identity))
+    return pool, budget.iterations
+
+
+def think(board: Board, current_state, time_budget: float = None, node_budget: int = None):
+    """ Performs MCTS by sampling games and calling the appropriate functions to construct the game tree.
+    The search stops at whichever budget runs out first; with neither given it samples num_nodes games.
+
+    Args:
+        board:  The game setup.
+        current_state:  The current state of the game.
+        time_budget:  The most seconds to search for.
+        node_budget:  The most games to sample.
+
+    Returns:    The action to be taken from the current state
+
+    """
+    if time_budget is None and node_budget is None:
+        node_budget = num_nodes
+    start = perf_counter()
+    pool, iterations = search(board, current_state, node_budget, time_budget)
+    wall_time = perf_counter() - start
+    logger.info("Iterations done: %d in %.3f s", iterations, wall_time)
+
+    best_action = get_best_action(pool)
+    if p2_telemetry.enabled():
+        nodes, depth = tree_shape(pool)
+        p2_telemetry.report(__name__, nodes=nodes, depth=depth, rows=len(pool),
+                            **p2_telemetry.search_fields(wall_time, iterations))
+
+    logger.info("Action chosen: %s", best_action)
+    return best_action
@@ -0,0 +1,62 @@
+""" Phase timings of the MCTS loop.
+
+Pass a Profiler to think in mcts_vanilla or mcts_modified and it collects the
+perf_counter_ns time and call count of traverse_nodes, expand_leaf, simulate
+(the rollout and its scoring) and backpropagate across every move it is given
+to. The search loop then calls timed wrappers of those functions; without a
+profiler it calls the functions themselves, so it has no timing code at all.
+"""
+
+from time import perf_counter_ns
+from p2_telemetry import PHASES
+
+PHASE_FUNCTIONS = dict(select='traverse_nodes', expand='expand_leaf', rollout='simulate', backprop='backpropagate')
+
+
+class Profiler:
+    """ Cumulative nanoseconds and calls of each phase of the MCTS loop. """
+
+    def __init__(self):
+        self.nanoseconds = dict.fromkeys(PHASES, 0)
+        self.calls = dict.fromkeys(PHASES, 0)
+
+    def add(self, phase: str, nanoseconds: int, calls: int = 1):
+        """ Counts calls more calls of phase, taking nanoseconds in all. """
+        self.nanoseconds[phase] += nanoseconds
+        self.calls[phase] += calls
+
+    def timed(self, phase: str, function):
+        """ Returns a wrapper of function that adds the time of each call to phase. """
+        nanoseconds, calls = self.nanoseconds, self.calls
+
+        def timed_function(*args):
+            began = perf_counter_ns()
+            result = function(*args)
+            nanoseconds[phase] += perf_counter_ns() - began
+            calls[phase] += 1
+            return result
+        return timed_function
+
+    def timed_phases(self, *functions):
+        """ Returns timed wrappers of the functions of the phases, given in PHASES order. """
+        return [self.timed(phase, function) for phase, function in zip(PHASES, functions)]
+
+    def merge(self, other):
+        """ Adds the timings of another profiler to these. """
+        for phase in PHASES:
+            self.add(phase, other.nanoseconds[phase], other.calls[phase])
+
+    def seconds(self):
+        """ Returns a phase -> seconds dictionary of the time spent so far. """
+        return dict((phase, nanoseconds / 1e9) for phase, nanoseconds in self.nanoseconds.items())
+
+    def breakdown(self):
+        """ Returns a table of the calls, total time, time per call and share of the total of each phase. """
+        total = sum(self.nanoseconds.values())
+        lines = ["  %-10s %-15s %10s %10s %12s %7s" % ("phase", "function", "calls", "total s", "us/call", "share")]
+        for phase in PHASES:
+            nanoseconds, calls = self.nanoseconds[phase], self.calls[phase]
+            lines.append("  %-10s %-15s %10d %10.3f %12.2f %6.1f%%" % (
+                phase, PHASE_FUNCTIONS[phase], calls, nanoseconds / 1e9, nanoseconds / 1e3 / calls if calls else 0,
+                100 * nanoseconds / total if total else 0))
+        return '\n'.join(lines)
@@ -0,0 +1,332 @@
+""" MCTS over a transposition table.
+
+Different move orders often reach the same state. Rather than a tree with one
+node per path, this search keeps one entry per state, keyed by state_key, so
+every path into a state shares its statistics and the nodes form a DAG. An
+edge is a (action, key) pair; an expansion whose state is already in the table
+links to the existing entry instead of creating a node.
+
+Moves are never undone, so the DAG has no cycles and each iteration's path
+visits an entry at most once. Backpropagation follows that recorded path
+rather than parent links, which an entry with several parents cannot have.
+Entries keep the bot's wins like MCTSNode does; the same state always has the
+same player to move, so they mean the same on every path.
+
+The table holds at most table_size entries. When it is full, adding one drops
+the least recently used entry ('lru') or the quarter of the entries with the
+fewest visits ('visits'), never one on the current path. An edge to a dropped
+entry is taken as soon as it is reached and the entry is re-created empty.
+"""
+
+import logging
+from collections import OrderedDict
+from random import randrange
+from time import perf_counter
+from mcts_budget import SearchBudget
+from mcts_ucb import sqrt_log, inv_sqrt, grow
+from p2_t3 import Board, PackedBoard
+import p2_telemetry
+
+num_nodes = 1000
+explore_faction = 2
+clock_interval = 8  # Iterations between clock checks when searching to a time budget
+expansion_order = 'random'  # Order of expansion: 'fixed' (legal_actions order) or 'random'
+table_size = 100000 # Most entries the transposition table holds
+eviction = 'lru'    # Which entries a full table drops: 'lru' or 'visits'
+
+logger = logging.getLogger(__name__)
+
+
+class TableEntry:
+    """ The statistics of one state, shared by every path that reaches it. """
+    __slots__ = ('actions', 'next_action', 'children', 'wins', 'visits')
+
+    def __init__(self, action_list):
+        self.actions = action_list          # Legal actions; the untried ones are actions[next_action:]
+        self.next_action = 0
+        self.children = []                  # (action, key) of each expanded action, in the order expanded
+        self.wins = 0                       # Total wins of all paths through the state
+        self.visits = 0                     # Number of times the state has been visited
+
+
+class TranspositionTable:
+    """ Entries by state_key, in least recently used order, with at most capacity of them. """
+
+    def __init__(self, capacity: int = None, policy: str = None):
+        self.entries = OrderedDict()
+        self.capacity = table_size if capacity is None else capacity
+        self.policy = eviction if policy is None else policy
+        self.created = 0                    # Entries created, including re-created ones
+        self.transpositions = 0             # Expansions that reached a state already in the table
+        self.evicted = 0                    # Entries dropped to make room
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key):
+        """ Returns the entry for key, marking it as recently used, or None if the table lacks it. """
+        entry = self.entries.get(key)
+        if entry is not None:
+            self.entries.move_to_end(key)
+        return entry
+
+    def add(self, key, action_list, path):
+        """ Creates the entry for key, making room first if the table is full, and returns it.
+        Entries on path, a list of (key, entry), are kept. """
+        if len(self.entries) >= self.capacity:
+            self.evict(path)
+        entry = self.entries[key] = TableEntry(action_list)
+        self.created += 1
+        return entry
+
+    def evict(self, path):
+        """ Drops entries, other than those on path, by the table's policy. """
+        keep = set(key for key, _ in path)
+        if self.policy == 'lru':
+            # The path was just used, so its entries are the last ones.
+            for key in self.entries:
+                if key not in keep:
+                    del self.entries[key]
+                    self.evicted += 1
+                    return
+        else:
+            by_visits = sorted((entry.visits, key) for key, entry in self.entries.items() if key not in keep)
+            for _, key in by_visits[:max(1, len(self.entries) // 4)]:
+                del self.entries[key]
+                self.evicted += 1
+
+
+def state_key(board: Board, state):
+    """ Returns the table key of state. A PackedBoard keeps the Zobrist key in the state, so Board.hash
+    reads it off; on the tuple Board it is computed from scratch, which is slower than Python hashing
+    the tuple itself, so the state is its own key there. """
+    return board.hash(state) if isinstance(board, PackedBoard) else state
+
+
+def new_action_list(board: Board, state):
+    """ Returns the actions a new entry for state will expand. """
+    return [] if board.is_ended(state) else board.legal_actions(state)
+
+
+def traverse_nodes(table: TranspositionTable, root_key, board: Board, state):
+    """ Descends from the root by UCB until it reaches an entry with untried actions, a terminal entry
+    or an edge whose entry has been dropped, which it re-creates.
+
+    Args:
+        table:      The transposition table.
+        root_key:   The key of the root state.
+        board:      The game setup.
+        state:      The state of the game at the root.
+
+    Returns:
+        path: The (key, entry) of each state visited, from the root down
+        state: The state of the last of them
+
+    """
+    key = root_key
+    entry = table.get(key)
+    path = [(key, entry)]
+    is_opponent = False
+    while entry.next_action == len(entry.actions) and entry.children:
+        if entry.visits >= len(sqrt_log):
+            grow(entry.visits)
+        explore = explore_faction * sqrt_log[entry.visits]
+        best_value = -1000000000
+        chosen = None
+        for action, child_key in entry.children:
+            child = table.entries.get(child_key)
+            if child is None:
+                # Dropped: count it unvisited, which UCB always picks first.
+                chosen = action, child_key, None
+                break
+            if child.visits >= len(inv_sqrt):
+                grow(child.visits)
+            exploit = child.wins / child.visits
+            if is_opponent:
+                exploit = 1 - exploit
+            value = exploit + explore * inv_sqrt[child.visits]
+            if value > best_value:
+                best_value = value
+                chosen = action, child_key, child
+
+        action, key, entry = chosen
+        state = board.next_state(state, action)
+        if entry is None:
+            entry = table.add(key, new_action_list(board, state), path)
+        else:
+            table.entries.move_to_end(key)
+        path.append((key, entry))
+        is_opponent = not is_opponent
+    return path, state
+
+
+def expand_leaf(table: TranspositionTable, path, board: Board, state):
+    """ Expands the next untried action of the last entry of path (if it is non-terminal), linking to the
+    entry of the resulting state if the table has one and creating it if not.
+
+    Args:
+        table:  The transposition table.
+        path:   The (key, entry) of each state from the root to the entry to expand; the child is appended.
+        board:  The game setup.
+        state:  The state of the last entry of path.
+
+    Returns:
+        state: The state of the entry now last on path
+
+    """
+    entry = path[-1][1]
+    if entry.next_action == len(entry.actions):
+        # A terminal entry: nothing left to expand.
+        return state
+
+    if expansion_order == 'random':
+        # Swap a random untried action to the front of the untried ones.
+        action_list, i, j = entry.actions, entry.next_action, randrange(entry.next_action, len(entry.actions))
+        action_list[i], action_list[j] = action_list[j], action_list[i]
+    action = entry.actions[entry.next_action]
+    entry.next_action += 1
+
+    state = board.next_state(state, action)
+    key = state_key(board, state)
+    entry.children.append((action, key))
+    child = table.get(key)
+    if child is None:
+        child = table.add(key, new_action_list(board, state), path)
+    else:
+        table.transpositions += 1
+    path.append((key, child))
+    return state
+
+
+def rollout(board: Board, state):
+    """ Given the state of the game, the rollout plays out the remainder randomly.
+
+    Args:
+        board:  The game setup.
+        state:  The state of the game.
+
+    Returns:
+        state: The terminal game state
+
+    """
+    return board.random_playout(state)
+
+
+def backpropagate(path, won: float, visits: int = 1):
+    """ Updates the win and visit count of each entry on the path the iteration took, the root's visits only.
+
+    Args:
+        path:   The (key, entry) of each state from the root to the leaf.
+        won:    The games won by the bot out of visits, with draws counted as half a win.
+        visits: The number of games played from the leaf.
+
+    """
+    path[0][1].visits += visits
+    for _, entry in path[1:]:
+        entry.visits += visits
+        entry.wins += won
+
+
+def table_depth(table: TranspositionTable, root: TableEntry):
+    """ Returns how many moves below the root the deepest entry reachable from it lies. Every path to a
+    state places the same number of pieces, so each entry is met at one depth only. """
+    depth = 0
+    seen = set()
+    level = [root]
+    while level:
+        below = []
+        for entry in level:
+            for _, key in entry.children:
+                child = table.entries.get(key)
+                if child is not None and key not in seen:
+                    seen.add(key)
+                    below.append(child)
+        if below:
+            depth += 1
+        level = below
+    return depth
+
+
+def get_best_action(table: TranspositionTable, root: TableEntry):
+    """ Selects the best action from the root entry, as mcts_vanilla.get_best_action does. """
+    val = -1000000000
+    visit = -1
+    chosen_move = None
+    for action, key in root.children:
+        child = table.entries.get(key)
+        if child is None or not child.visits:
+            continue
+        if child.wins / child.visits > val:
+            if child.visits > visit:
+                val = child.wins / child.visits
+                visit = child.visits
+                chosen_move = action
+    return chosen_move
+
+
+def is_win(board: Board, state, identity_of_bot: int):
+    # scores a terminal state for identity_of_bot: 1 for a win, 0.5 for a draw and 0 for a loss
+    outcome = board.win_values(state)
+    assert outcome is not None, "is_win was called on a non-terminal state"
+    return outcome[identity_of_bot]
+
+
+def search(board: Board, current_state, node_budget: int = None, time_budget: float = None,
+           table: TranspositionTable = None):
+    """ Performs MCTS by sampling games and calling the appropriate functions to grow the table.
+
+    Args:
+        board:  The game setup.
+        current_state:  The current state of the game.
+        node_budget:  The most games to sample, or None for no limit.
+        time_budget:  The most seconds to search for, or None for no limit.
+        table:  The transposition table to fill, or None for a new one.
+
+    Returns:    The table, the root entry and the number of games sampled
+
+    """
+    bot_identity = board.current_player(current_state) # 1 or 2
+    if table is None:
+        table = TranspositionTable()
+    root_key = state_key(board, current_state)
+    root = table.get(root_key)
+    if root is None:
+        root = table.add(root_key, new_action_list(board, current_state), [])
+    budget = SearchBudget(node_budget, time_budget, clock_interval)
+    while budget.next_iteration():
+        path, state = traverse_nodes(table, root_key, board, current_state)
+        state = expand_leaf(table, path, board, state)
+        state = rollout(board, state)
+        backpropagate(path, is_win(board, state, bot_identity))
+    return table, root, budget.iterations
+
+
+def think(board: Board, current_state, time_budget: float = None, node_budget: int = None):
+    """ Performs MCTS by sampling games and calling the appropriate functions to grow the table.
+    The search stops at whichever budget runs out first; with neither given it samples num_nodes games.
+
+    Args:
+        board:  The game setup.
+        current_state:  The current state of the game.
+        time_budget:  The most seconds to search for.
+        node_budget:  The most games to sample.
+
+    Returns:    The action to be taken from the current state
+
+    """
+    if time_budget is None and node_budget is None:
+        node_budget = num_nodes
+    start = perf_counter()
+    table, root, iterations = search(board, current_state, node_budget, time_budget)
+    wall_time = perf_counter() - start
+    logger.info("Iterations done: %d in %.3f s (%d entries, %d transpositions)",
+                iterations, wall_time, len(table), table.transpositions)
+
+    best_action = get_best_action(table, root)
+    if p2_telemetry.enabled():
+        p2_telemetry.report(__name__, nodes=len(table), depth=table_depth(table, root),
+                            transpositions=table.transpositions, evicted=table.evicted,
+                            **p2_telemetry.search_fields(wall_time, iterations))
+
+    logger.info("Action chosen: %s", best_action)
+    return best_action
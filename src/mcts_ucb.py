@@ -0,0 +1,55 @@
+""" UCB child selection with the square-root and logarithm terms looked up by visit count.
+
+The UCB value of a child with wins w and visits n under a parent with N visits is
+
+    w / n + c * sqrt(ln(N) / n)
+
+from the bot's side, with 1 - w / n in place of w / n when the opponent chooses.
+Its exploration term is c * sqrt_log[N] * inv_sqrt[n]. The tables grow as the
+visit counts do.
+"""
+
+from math import sqrt, log
+
+sqrt_log = []   # sqrt(ln(n)) for each visit count n
+inv_sqrt = []   # 1 / sqrt(n) for each visit count n
+
+
+def grow(n: int):
+    """ Extends the tables to cover visit counts up to at least n. """
+    size = max(n + 1, 2 * len(sqrt_log), 1024)
+    for visits in range(len(sqrt_log), size):
+        sqrt_log.append(sqrt(log(visits)) if visits else 0.0)
+        inv_sqrt.append(1 / sqrt(visits) if visits else float('inf'))
+
+
+grow(1 << 16)
+
+
+def select_child(node, is_opponent: bool, explore_faction: float):
+    """ Returns the child of node with the highest UCB value, the first of them on ties.
+
+    Args:
+        node:               A node with at least one child, all of them visited.
+        is_opponent:        Whether the opponent of the bot chooses at node.
+        explore_faction:    The weight c of the exploration term.
+
+    Returns:                The chosen child.
+
+    """
+    try:
+        explore = explore_faction * sqrt_log[node.visits]
+        best_value = -1000000000
+        chosen = None
+        for child in node.children:
+            exploit = child.wins / child.visits
+            if is_opponent:
+                exploit = 1 - exploit
+            value = exploit + explore * inv_sqrt[child.visits]
+            if value > best_value:
+                best_value = value
+                chosen = child
+        return chosen
+    except IndexError:
+        grow(max([node.visits] + [child.visits for child in node.children]))
+        return select_child(node, is_opponent, explore_faction)
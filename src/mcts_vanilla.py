@@ -1,12 +1,29 @@
 
-from math import sqrt, log
+import logging
+from random import choice, randrange
+from time import perf_counter
 from mcts_node import MCTSNode
+from mcts_profile import Profiler
+from mcts_budget import SearchBudget
+from mcts_ucb import select_child
 from p2_t3 import Board
-from random import choice
+import mcts_parallel
+import p2_telemetry
 
 
 num_nodes = 1000
 explore_faction = 2
+clock_interval = 8  # Iterations between clock checks when searching to a time budget
+leaf_rollouts = 1   # Rollouts played from each expanded leaf
+workers = 0         # Worker processes for the leaf rollouts; 0 plays them in this process
+root_workers = 4    # Worker processes, and so trees, for think_root_parallel
+tree_workers = 4    # Threads sharing the tree in think_tree_parallel
+virtual_loss = 1    # Lost games put on a path while a think_tree_parallel rollout runs
+expansion_order = 'random'  # Order of expansion: 'fixed' (legal_actions order), 'random' or 'priority'
+expand_all = False  # Whether expanding a node adds all its children at once, with prior_visits visits each
+prior_visits = 1    # Visits given to each child added by expand_all, at least 1
+
+logger = logging.getLogger(__name__)
 
 def traverse_nodes(node: MCTSNode, board: Board, state, bot_identity: int):
     """ Traverses the tree until the end criterion are met.
@@ -31,28 +48,30 @@ def traverse_nodes(node: MCTSNode, board: Board, state, bot_identity: int):
     current_game = state
     current_board = board
     current_identity = bot_identity
-    while starter.untried_actions == [] and current_board.is_ended(current_game) != True:
-        uct_val = -1000000000
-        chosen_node = None
-        chosen_move = None
+    # Terminal nodes are created with no untried actions and never get children.
+    while starter.next_action == len(starter.actions) and starter.children:
         # Finding the node with the maximum UCT
-        for instances in starter.child_nodes.keys():
-            #print("Current Stats: ", starter.child_nodes[instances].parent.visits, starter.child_nodes[instances].wins, starter.child_nodes[instances].visits)
-            #print("Current UCT: ", ucb(starter.child_nodes[instances], (bot_identity != 1)))
-            #print()
-            if ucb(starter.child_nodes[instances], (current_identity != bot_identity)) > uct_val:
-                uct_val = ucb(starter.child_nodes[instances], (current_identity != bot_identity))
-                chosen_node = starter.child_nodes[instances]
-                chosen_move = instances
-        
-        starter = chosen_node
-        current_game = current_board.next_state(current_game, chosen_move)
+        starter = select_child(starter, current_identity != bot_identity, explore_faction)
+        current_game = current_board.next_state(current_game, starter.parent_action)
         current_identity = (1 if current_identity == 2 else 2)
 
     return starter, current_game
     
 
 
+def move_priority(board: Board, state, action):
+    """ A cheap estimate of how promising an action is: 1 if it wins its sub-board, else 0. """
+    return 1 if board.captures(state, action) else 0
+
+def new_action_list(board: Board, state):
+    """ Returns the actions a new node for state will expand, in the order set by expansion_order. """
+    if board.is_ended(state):
+        return []
+    action_list = board.legal_actions(state)
+    if expansion_order == 'priority':
+        action_list.sort(key=lambda action: -move_priority(board, state, action))
+    return action_list
+
 def expand_leaf(node: MCTSNode, board: Board, state):
     """ Adds a new leaf to the tree by creating a new child node for the given node (if it is non-terminal).
 
@@ -69,20 +88,66 @@ def expand_leaf(node: MCTSNode, board: Board, state):
     
     current_board = board
     current_game = state
-    if current_board.is_ended(current_game) == True:
+    if node.next_action == len(node.actions):
+        # A terminal node: nothing left to expand.
         return node, state
+    if expand_all:
+        return expand_children(node, board, state)
 
-
-    move_chosen = node.untried_actions[0]
-    node.untried_actions.pop(0)
+    if expansion_order == 'random':
+        # Swap a random untried action to the front of the untried ones.
+        actions, i, j = node.actions, node.next_action, randrange(node.next_action, len(node.actions))
+        actions[i], actions[j] = actions[j], actions[i]
+    move_chosen = node.actions[node.next_action]
+    node.next_action += 1
 
     current_game = current_board.next_state(current_game, move_chosen)
-    new_node = MCTSNode(parent = node, parent_action = move_chosen, action_list = current_board.legal_actions(current_game))
-
-    node.child_nodes[move_chosen] = new_node
+    new_node = node.add_child(move_chosen, new_action_list(current_board, current_game))
     return new_node, current_game
 
 
+def expand_children(node: MCTSNode, board: Board, state):
+    """ Adds a child for every untried action of the node at once. Each child starts with prior_visits
+    visits won at a rate favouring the player to move by move_priority. prior_visits must be at least 1,
+    as selection divides by the visits of every child; a ValueError is raised otherwise.
+
+    Args:
+        node:   The node whose children will be added.
+        board:  The game setup.
+        state:  The state of the game.
+
+    Returns:
+        node: The added child with the highest priority (a random one of them on ties)
+        state: The state associated with that node
+
+    """
+    if prior_visits < 1:
+        raise ValueError("expand_all needs prior_visits of at least 1, got %r" % prior_visits)
+    # The bot moves at the root and at every second level below it.
+    depth = 0
+    parent = node.parent
+    while parent is not None:
+        depth += 1
+        parent = parent.parent
+    bot_to_move = depth % 2 == 0
+
+    best = []
+    best_priority = None
+    for action in node.actions[node.next_action:]:
+        priority = move_priority(board, state, action)
+        child_state = board.next_state(state, action)
+        child = node.add_child(action, new_action_list(board, child_state))
+        rate = 0.5 + 0.25 * priority
+        child.visits = prior_visits
+        child.wins = prior_visits * (rate if bot_to_move else 1 - rate)
+        if best_priority is None or priority > best_priority:
+            best, best_priority = [], priority
+        if priority == best_priority:
+            best.append((child, child_state))
+    node.next_action = len(node.actions)
+    return choice(best)
+
+
 def rollout(board: Board, state):
     """ Given the state of the game, the rollout plays out the remainder randomly.
 
@@ -94,51 +159,36 @@ def rollout(board: Board, state):
         state: The terminal game state
 
     """
-    current_board = board
-    current_game = state
-    starter = 0 
-    while current_board.is_ended(current_game) != True:
-        #print("move count: ", starter)
-        starter += 1
-        move_chosen = choice(current_board.legal_actions(current_game))
-        current_game = current_board.next_state(current_game, move_chosen)
-    return current_game
+    return board.random_playout(state)
 
 
-def backpropagate(node: MCTSNode|None, won: bool):
-    """ Navigates the tree from a leaf node to the root, updating the win and visit count of each node along the path.
+def simulate(board: Board, state, bot_identity: int):
+    """ Plays the rollouts from a new leaf, leaf_rollouts of them, in worker processes if workers is set.
 
-    Args:
-        node:   A leaf node.
-        won:    An indicator of whether the bot won or lost the game.
+    Returns:    The games won by the bot, with draws counted as half a win, and the games played
 
     """
-    node.visits += 1
-    if node.parent == None: 
-        return
-    node.wins += won
-    backpropagate(node.parent, won)
+    if leaf_rollouts > 1 or workers:
+        return mcts_parallel.leaf_rollouts(board, state, bot_identity, leaf_rollouts, workers), leaf_rollouts
+    return is_win(board, rollout(board, state), bot_identity), 1
 
-def ucb(node: MCTSNode, is_opponent: bool):
-    """ Calcualtes the UCB value for the given node from the perspective of the bot
+
+def backpropagate(node: MCTSNode|None, won: float, visits: int = 1):
+    """ Navigates the tree from a leaf node to the root, updating the win and visit count of each node along the path.
+    The path is followed through the parent links that traverse_nodes and expand_leaf descended, so the walk
+    neither recurses nor allocates.
 
     Args:
-        node:   A node.
-        is_opponent: A boolean indicating whether or not the last action was performed by the MCTS bot
-    Returns:
-        The value of the UCB function for the given node
+        node:   A leaf node.
+        won:    The games won by the bot out of visits, with draws counted as half a win.
+        visits: The number of games played from the leaf.
+
     """
-    if node.parent == None:
-        # root node
-        return -1 
-    natural_log = log(node.parent.visits) / log(2.71828)
-    exploit = None
-    if is_opponent:
-        exploit = 1 - (node.wins / node.visits)
-    else:
-        exploit = (node.wins / node.visits)
-    explore = explore_faction * sqrt(natural_log / node.visits)
-    return exploit + explore
+    while node.parent is not None:
+        node.visits += visits
+        node.wins += won
+        node = node.parent
+    node.visits += visits
 
 def get_best_action(root_node: MCTSNode):
     """ Selects the best action from the root node in the MCTS tree
@@ -153,46 +203,195 @@ def get_best_action(root_node: MCTSNode):
     visit = -1
     chosen_move = None
     # Finding the node with the maximum UCT
-    for instances in root_node.child_nodes.keys():
-        if root_node.child_nodes[instances].wins / root_node.child_nodes[instances].visits > val:
-            if root_node.child_nodes[instances].visits > visit:
-                val = root_node.child_nodes[instances].wins / root_node.child_nodes[instances].visits
-                visit = root_node.child_nodes[instances].visits
-                chosen_move = instances
+    for child in root_node.children or ():
+        if child.wins / child.visits > val:
+            if child.visits > visit:
+                val = child.wins / child.visits
+                visit = child.visits
+                chosen_move = child.parent_action
     return chosen_move
 
 def is_win(board: Board, state, identity_of_bot: int):
-    # checks if state is a win state for identity_of_bot
-    outcome = board.points_values(state)
+    # scores a terminal state for identity_of_bot: 1 for a win, 0.5 for a draw and 0 for a loss
+    outcome = board.win_values(state)
     assert outcome is not None, "is_win was called on a non-terminal state"
-    return outcome[identity_of_bot] == 1
+    return outcome[identity_of_bot]
 
-def think(board: Board, current_state):
+def search(board: Board, current_state, node_budget: int = None, time_budget: float = None,
+           root_node: MCTSNode = None, profiler: Profiler = None):
     """ Performs MCTS by sampling games and calling the appropriate functions to construct the game tree.
 
     Args:
         board:  The game setup.
         current_state:  The current state of the game.
+        node_budget:  The most games to sample, or None for no limit.
+        time_budget:  The most seconds to search for, or None for no limit.
+        root_node:  A tree for current_state to keep growing, or None to start a new one.
+        profiler:  A Profiler to add the time of each phase to, or None.
 
-    Returns:    The action to be taken from the current state
+    Returns:    The root node of the tree and the number of games sampled
 
     """
     bot_identity = board.current_player(current_state) # 1 or 2
-    root_node = MCTSNode(parent=None, parent_action=None, action_list=board.legal_actions(current_state))
-    print("Current num_nodes: ", num_nodes)
-    for _ in range(num_nodes):
-        state = current_state
-        node = root_node 
-        node, state = traverse_nodes(node, board, state, bot_identity)
-        node, state = expand_leaf(node, board, state)
-        state = rollout(board, state)
-        backpropagate(node, is_win(board, state, bot_identity))
+    if root_node is None:
+        root_node = MCTSNode(parent=None, parent_action=None, action_list=new_action_list(board, current_state))
+    select, expand, play, update = traverse_nodes, expand_leaf, simulate, backpropagate
+    if profiler is not None:
+        select, expand, play, update = profiler.timed_phases(select, expand, play, update)
+    budget = SearchBudget(node_budget, time_budget, clock_interval)
+    while budget.next_iteration():
+        node, state = select(root_node, board, current_state, bot_identity)
+        node, state = expand(node, board, state)
+        won, visits = play(board, state, bot_identity)
+        update(node, won, visits)
+    return root_node, budget.iterations
+
+def think(board: Board, current_state, time_budget: float = None, node_budget: int = None,
+          profiler: Profiler = None):
+    """ Performs MCTS by sampling games and calling the appropriate functions to construct the game tree.
+    The search stops at whichever budget runs out first; with neither given it samples num_nodes games.
+
+    Args:
+        board:  The game setup.
+        current_state:  The current state of the game.
+        time_budget:  The most seconds to search for.
+        node_budget:  The most games to sample.
+        profiler:  A Profiler to add the time of each phase of the search to, or None.
 
+    Returns:    The action to be taken from the current state
+
+    """
+    if time_budget is None and node_budget is None:
+        node_budget = num_nodes
+    move_profiler = Profiler() if profiler is not None or p2_telemetry.enabled() else None
+    start = perf_counter()
+    root_node, iterations = search(board, current_state, node_budget, time_budget, profiler=move_profiler)
+    wall_time = perf_counter() - start
+    if profiler is not None:
+        profiler.merge(move_profiler)
+    logger.info("Iterations done: %d in %.3f s", iterations, wall_time)
 
     # Return an action, typically the most frequently used action (from the root) or the action with the best
     # estimated win rate.
     #print(root_node.tree_to_string(horizon=2))
     best_action = get_best_action(root_node)
+    report(root_node, wall_time, iterations, move_profiler)
     
-    print(f"Action chosen: {best_action}")
+    logger.info("Action chosen: %s", best_action)
+    return best_action
+
+def report(root_node: MCTSNode, wall_time: float, iterations: int, profiler: Profiler = None):
+    """ Reports a move searched with the given tree, and profiled by profiler if given, to p2_telemetry,
+    if it is on. """
+    if p2_telemetry.enabled():
+        nodes, depth = p2_telemetry.tree_shape(root_node)
+        phases = profiler.seconds() if profiler is not None else None
+        p2_telemetry.report(__name__, nodes=nodes, depth=depth,
+                            **p2_telemetry.search_fields(wall_time, iterations, iterations * leaf_rollouts, phases))
+
+def think_root_parallel(board: Board, current_state):
+    """ Performs MCTS with root_workers independent trees built in worker processes, each with
+    num_nodes / root_workers iterations, and picks the action from their merged root statistics.
+
+    Args:
+        board:  The game setup.
+        current_state:  The current state of the game.
+
+    Returns:    The action to be taken from the current state
+
+    """
+    logger.debug("Current num_nodes: %d", num_nodes)
+    start = perf_counter()
+    root_node = mcts_parallel.root_parallel(__name__, board, current_state, num_nodes, root_workers)
+    best_action = get_best_action(root_node)
+    report(root_node, perf_counter() - start, num_nodes)
+
+    logger.info("Action chosen: %s", best_action)
     return best_action
+
+def think_tree_parallel(board: Board, current_state):
+    """ Performs MCTS with tree_workers threads descending one shared tree, using virtual loss to
+    spread them over different paths. The threads take turns under the interpreter lock, so this
+    takes as long as think with num_nodes; see mcts_parallel.
+
+    Args:
+        board:  The game setup.
+        current_state:  The current state of the game.
+
+    Returns:    The action to be taken from the current state
+
+    """
+    logger.debug("Current num_nodes: %d", num_nodes)
+    start = perf_counter()
+    root_node = mcts_parallel.tree_parallel(__name__, board, current_state, num_nodes, tree_workers, virtual_loss)
+    best_action = get_best_action(root_node)
+    report(root_node, perf_counter() - start, num_nodes)
+
+    logger.info("Action chosen: %s", best_action)
+    return best_action
+
+class SearchSession:
+    """ Keeps the search tree between moves of one game. Each call to think re-roots the tree on the
+    node reached by the bot's last move and the opponent's reply, keeping its statistics, and starts a
+    fresh tree only when that node was never expanded or the game is a different one.
+
+    Use the bound think method as the player: SearchSession().think
+    """
+
+    def __init__(self):
+        self.root_node = None
+        self.root_state = None
+        self.last_action = None
+
+    def reroot(self, board: Board, current_state):
+        """ Returns the node of the kept tree for current_state, detached from the rest of the tree,
+        or None if the tree does not hold it. """
+        if self.root_node is None:
+            return None
+        if current_state == self.root_state:
+            return self.root_node
+
+        child = self.root_node.child_nodes.get(self.last_action)
+        if child is None:
+            return None
+        child_state = board.next_state(self.root_state, self.last_action)
+        for grandchild in child.children or ():
+            if board.next_state(child_state, grandchild.parent_action) == current_state:
+                grandchild.parent = None
+                grandchild.parent_action = None
+                return grandchild
+        return None
+
+    def think(self, board: Board, current_state, time_budget: float = None, node_budget: int = None,
+              profiler: Profiler = None):
+        """ Performs MCTS like mcts_vanilla.think, continuing from the tree kept since the last move.
+
+        Args:
+            board:  The game setup.
+            current_state:  The current state of the game.
+            time_budget:  The most seconds to search for.
+            node_budget:  The most games to sample.
+            profiler:  A Profiler to add the time of each phase of the search to, or None.
+
+        Returns:    The action to be taken from the current state
+
+        """
+        if time_budget is None and node_budget is None:
+            node_budget = num_nodes
+        root_node = self.reroot(board, current_state)
+        reused = root_node.visits if root_node is not None else 0
+
+        move_profiler = Profiler() if profiler is not None or p2_telemetry.enabled() else None
+        start = perf_counter()
+        root_node, iterations = search(board, current_state, node_budget, time_budget, root_node, move_profiler)
+        wall_time = perf_counter() - start
+        if profiler is not None:
+            profiler.merge(move_profiler)
+        logger.info("Iterations done: %d in %.3f s (%d reused)", iterations, wall_time, reused)
+
+        best_action = get_best_action(root_node)
+        report(root_node, wall_time, iterations, move_profiler)
+        self.root_node, self.root_state, self.last_action = root_node, current_state, best_action
+
+        logger.info("Action chosen: %s", best_action)
+        return best_action
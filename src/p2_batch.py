@@ -0,0 +1,133 @@
+""" Random playouts of many Ultimate Tic-Tac-Toe games at once with NumPy.
+
+A batch keeps every game as rows of arrays: the sub-board masks (N, 9, 2), the
+big-board masks (N, 2), the required board (N,) with -1 when free, the index of
+the player to move (N,) and the result (N,) as given by p2_t3.outcome. Each
+step plays one uniformly random legal move in every unfinished game.
+
+States are in the tuple layout of p2_t3.Board; convert packed states with
+p2_t3.decode_state first.
+"""
+
+import numpy as np
+import p2_t3
+from p2_t3_tables import has_line, cells
+
+HAS_LINE = np.array(has_line, dtype=bool)
+POPCOUNT = np.array([len(c) for c in cells], dtype=np.int64)
+# NTH_CELL[mask, k] is the k-th set cell of mask.
+NTH_CELL = np.array([c + (0,) * (9 - len(c)) for c in cells], dtype=np.int64)
+BOARDS = np.arange(9)
+
+
+class Batch:
+    """ N games in array form. """
+
+    def __init__(self, states):
+        n = len(states)
+        self.masks = np.zeros((n, 9, 2), dtype=np.uint16)
+        self.meta = np.zeros((n, 2), dtype=np.uint16)
+        self.constraint = np.full(n, -1, dtype=np.int64)
+        self.player = np.zeros(n, dtype=np.int64)
+
+        for i, state in enumerate(states):
+            self.masks[i] = np.reshape(state[:18], (9, 2))
+            self.meta[i] = state[18:20]
+            if state[20] is not None:
+                self.constraint[i] = 3 * state[20] + state[21]
+            self.player[i] = state[22] - 1
+
+        self.result = _outcome(self.meta[:, 0], self.meta[:, 1])
+
+    def __len__(self):
+        return len(self.result)
+
+    def states(self):
+        """ Returns the games as states in the tuple layout of p2_t3.Board. """
+        states = []
+        for i in range(len(self)):
+            state = [int(m) for m in self.masks[i].ravel()]
+            state.extend(int(m) for m in self.meta[i])
+            constraint = int(self.constraint[i])
+            state.extend((None, None) if constraint < 0 else divmod(constraint, 3))
+            state.append(int(self.player[i]) + 1)
+            states.append(tuple(state))
+        return states
+
+    def step(self, rng):
+        """ Plays one random move in every unfinished game. Returns how many games moved. """
+        rows = np.flatnonzero(self.result == p2_t3.ONGOING)
+        n = len(rows)
+        if not n:
+            return 0
+
+        masks = self.masks[rows]
+        finished = self.meta[rows, 0] | self.meta[rows, 1]
+        constraint = self.constraint[rows]
+        player = self.player[rows]
+
+        # Free cells of every sub-board the move may go in, 0 for the others.
+        allowed = ((finished[:, None] >> BOARDS) & 1) == 0
+        allowed &= (constraint[:, None] < 0) | (constraint[:, None] == BOARDS)
+        free = np.where(allowed, ~(masks[:, :, 0] | masks[:, :, 1]) & 0x1ff, 0)
+
+        # Pick the k-th legal move uniformly, then find its sub-board and cell.
+        counts = POPCOUNT[free]
+        cumulative = counts.cumsum(axis=1)
+        k = (rng.random(n) * cumulative[:, -1]).astype(np.int64)
+        board = (cumulative <= k[:, None]).sum(axis=1)
+        k -= cumulative[np.arange(n), board] - counts[np.arange(n), board]
+        cell = NTH_CELL[free[np.arange(n), board], k]
+
+        updated = masks[np.arange(n), board, player] | (1 << cell).astype(np.uint16)
+        self.masks[rows, board, player] = updated
+        other = masks[np.arange(n), board, 1 - player]
+        bit = (1 << board).astype(np.uint16)
+
+        won = HAS_LINE[updated]
+        self.meta[rows[won], player[won]] |= bit[won]
+        full = ~won & ((updated | other) == 0x1ff)
+        self.meta[rows[full], 0] |= bit[full]
+        self.meta[rows[full], 1] |= bit[full]
+
+        p1_boards, p2_boards = self.meta[rows, 0], self.meta[rows, 1]
+        self.result[rows] = _outcome(p1_boards, p2_boards)
+        closed = (((p1_boards | p2_boards) >> cell) & 1).astype(bool)
+        self.constraint[rows] = np.where(closed, -1, cell)
+        self.player[rows] = 1 - player
+        return n
+
+    def play_out(self, rng, max_depth=None):
+        """ Steps until every game has ended, or for at most max_depth moves. """
+        depth = 0
+        while depth != max_depth and self.step(rng):
+            depth += 1
+
+
+def _outcome(p1_boards, p2_boards):
+    """ Vectorized p2_t3.outcome. """
+    return np.select(
+        [HAS_LINE[p1_boards & ~p2_boards], HAS_LINE[p2_boards & ~p1_boards], (p1_boards | p2_boards) == 0x1ff],
+        [p2_t3.P1_WIN, p2_t3.P2_WIN, p2_t3.DRAW],
+        p2_t3.ONGOING,
+    )
+
+
+def evaluate(states, playouts, identity, rng=None):
+    """ Plays playouts random games from each of the given states.
+
+    Args:
+        states:     A sequence of K states in the tuple layout of p2_t3.Board.
+        playouts:   The number of random games to play from each state.
+        identity:   The player, 1 or 2, whose wins are counted.
+        rng:        A numpy.random.Generator, or None for a fresh one.
+
+    Returns:        An array of K win counts, with draws counted as half a win.
+
+    """
+    if rng is None:
+        rng = np.random.default_rng()
+    batch = Batch([state for state in states for _ in range(playouts)])
+    batch.play_out(rng)
+    score = (batch.result == identity) + 0.5 * (batch.result == p2_t3.DRAW)
+    return score.reshape(len(states), playouts).sum(axis=1)
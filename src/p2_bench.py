@@ -0,0 +1,451 @@
+import os
+import sys
+import random
+import contextlib
+import tracemalloc
+from timeit import default_timer as time
+import p2_t3
+import p2_t3_tables
+
+
+def playouts(board, games, seed=0):
+    """ Plays the given number of full random games and returns the final states. """
+    rng = random.Random(seed)
+    finals = []
+    for _ in range(games):
+        state = board.starting_state()
+        while not board.is_ended(state):
+            state = board.next_state(state, rng.choice(board.legal_actions(state)))
+        finals.append(state)
+    return finals
+
+
+def bench_packed(games=2000):
+    """ Full random playouts with tuple states against packed int states. """
+    for board in (p2_t3.Board(), p2_t3.PackedBoard()):
+        start = time()
+        finals = playouts(board, games)
+        elapsed = time() - start
+
+        tracemalloc.start()
+        playouts(board, 50)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        print("%-12s %8.0f playouts/s  %4d bytes/state  %8d bytes peak (50 games)" % (
+            type(board).__name__, games / elapsed, sys.getsizeof(finals[-1]), peak))
+
+
+def bench_tables(repeat=200):
+    """ Sub-board win checks by scanning Board.wins against one p2_t3_tables.has_line lookup. """
+    masks = range(512)
+    wins = p2_t3.Board.wins
+    has_line = p2_t3_tables.has_line
+
+    start = time()
+    for _ in range(repeat):
+        for mask in masks:
+            any(mask & w == w for w in wins)
+    scan = time() - start
+
+    start = time()
+    for _ in range(repeat):
+        for mask in masks:
+            has_line[mask]
+    lookup = time() - start
+
+    checks = repeat * len(masks)
+    print("scan   %8.1f ns/check" % (1e9 * scan / checks))
+    print("lookup %8.1f ns/check  (%.1fx)" % (1e9 * lookup / checks, scan / lookup))
+
+
+def bench_moves(games=300):
+    """ Legal-move generation on positions from random games: the old comprehension,
+    Board.legal_actions from the free-cell tables, and Board.legal_mask with choose_action. """
+    board = p2_t3.Board()
+    positions = p2_t3.positions
+    rng = random.Random(0)
+    states = []
+    for _ in range(games):
+        state = board.starting_state()
+        while not board.is_ended(state):
+            states.append(state)
+            state = board.next_state(state, rng.choice(board.legal_actions(state)))
+
+    def comprehension(state):
+        R, C = state[20], state[21]
+        Rset, Cset = (R,), (C,)
+        if R is None:
+            Rset, Cset = range(3), range(3)
+        occupied = [state[2 * x] | state[2 * x + 1] for x in range(9)]
+        finished = state[18] | state[19]
+        return [
+            (R, C, r, c)
+            for R in Rset
+            for C in Cset
+            for r in range(3)
+            for c in range(3)
+            if not occupied[3 * R + C] & positions[(r, c)]
+            and not finished & positions[(R, C)]
+        ]
+
+    variants = [
+        ("comprehension + choice", lambda state: rng.choice(comprehension(state))),
+        ("legal_actions + choice", lambda state: rng.choice(board.legal_actions(state))),
+        ("legal_mask + choose_action", lambda state: p2_t3.choose_action(board.legal_mask(state), rng)),
+    ]
+    for name, pick in variants:
+        start = time()
+        for state in states:
+            pick(state)
+        elapsed = time() - start
+        print("%-28s %8.1f us/move" % (name, 1e6 * elapsed / len(states)))
+
+
+def bench_playout(games=2000):
+    """ Playouts per second of the per-move Python loop against Board.random_playout. """
+    for board in (p2_t3.Board(), p2_t3.PackedBoard()):
+        start = time()
+        playouts(board, games)
+        loop = time() - start
+
+        rng = random.Random(0)
+        state0 = board.starting_state()
+        start = time()
+        for _ in range(games):
+            board.random_playout(state0, rng)
+        kernel = time() - start
+
+        start = time()
+        for _ in range(games):
+            board.random_playout(state0, rng, greedy=True)
+        greedy = time() - start
+
+        print("%-12s loop %7.0f  random_playout %7.0f  greedy %7.0f  playouts/s" % (
+            type(board).__name__, games / loop, games / kernel, games / greedy))
+
+
+def bench_batch(games=4000):
+    """ Playouts per second of Board.random_playout against p2_batch at several batch sizes. """
+    import numpy as np
+    import p2_batch
+
+    board = p2_t3.Board()
+    state0 = board.starting_state()
+    rng = random.Random(0)
+    start = time()
+    for _ in range(games):
+        board.random_playout(state0, rng)
+    print("%-22s %8.0f playouts/s" % ("Board.random_playout", games / (time() - start)))
+
+    generator = np.random.default_rng(0)
+    for size in (100, 1000, games):
+        start = time()
+        for _ in range(games // size):
+            p2_batch.evaluate([state0], size, 1, generator)
+        print("%-22s %8.0f playouts/s" % ("p2_batch x %d" % size, games / (time() - start)))
+
+
+def match(board, player1, player2):
+    """ Plays one game between two think functions, silencing their output, and returns its result. """
+    state = board.starting_state()
+    players = (player1, player2)
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        while not board.is_ended(state):
+            state = board.next_state(state, players[board.current_player(state) - 1](board, state))
+    return board.result(state)
+
+
+def bench_root(games=10, iterations=1000):
+    """ Iterations per second of mcts_vanilla.think_root_parallel as workers are added, and its
+    score against the serial mcts_vanilla.think at the same total num_nodes. """
+    import mcts_vanilla
+    import mcts_parallel
+
+    board = p2_t3.Board()
+    state0 = board.starting_state()
+    mcts_vanilla.num_nodes = iterations
+    print("cores: %d" % os.cpu_count())
+    for workers in (1, 2, 4, 8):
+        mcts_vanilla.root_workers = workers
+        random.seed(0)
+        mcts_parallel.root_parallel('mcts_vanilla', board, state0, workers, workers)  # Start the pool.
+        start = time()
+        mcts_parallel.root_parallel('mcts_vanilla', board, state0, iterations, workers)
+        rate = iterations / (time() - start)
+
+        score = 0.0
+        for game in range(games):
+            if game % 2:
+                result = match(board, mcts_vanilla.think, mcts_vanilla.think_root_parallel)
+                score += {p2_t3.P2_WIN: 1, p2_t3.DRAW: 0.5}.get(result, 0)
+            else:
+                result = match(board, mcts_vanilla.think_root_parallel, mcts_vanilla.think)
+                score += {p2_t3.P1_WIN: 1, p2_t3.DRAW: 0.5}.get(result, 0)
+        print("%d workers %8.0f iterations/s  score vs serial %4.1f / %d" % (workers, rate, score, games))
+    mcts_parallel.shutdown_pool()
+
+
+def bench_tree(iterations=2000):
+    """ Iterations per second of mcts_parallel.tree_parallel as threads are added, which stays flat
+    as they share the interpreter lock. That one thread builds the same tree as mcts_vanilla.search
+    is checked by tests/test_mcts_parallel.py. """
+    import mcts_parallel
+
+    board = p2_t3.Board()
+    state0 = board.starting_state()
+    for threads in (1, 2, 4, 8):
+        start = time()
+        mcts_parallel.tree_parallel('mcts_vanilla', board, state0, iterations, threads)
+        print("%d threads %8.0f iterations/s" % (threads, iterations / (time() - start)))
+
+
+def bench_pool(iterations=5000):
+    """ Retained bytes per expanded node and iterations per second of the MCTSNode tree of mcts_vanilla
+    against the array-backed mcts_pool tree. """
+    import mcts_vanilla
+    import mcts_pool
+
+    board = p2_t3.Board()
+    state0 = board.starting_state()
+    for name, search in (("MCTSNode", mcts_vanilla.search), ("NodePool", mcts_pool.search)):
+        random.seed(0)
+        start = time()
+        search(board, state0, iterations)
+        rate = iterations / (time() - start)
+
+        random.seed(0)
+        tracemalloc.start()
+        tree, _ = search(board, state0, iterations)
+        retained = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        print("%-9s %6.0f bytes/node  %8.0f iterations/s" % (name, retained / (iterations + 1), rate))
+
+
+def configured(module, **settings):
+    """ Returns a player that sets the given module settings before each call to module.think, so two
+    configurations of one module can play each other. """
+    def player(board, state):
+        for name, value in settings.items():
+            setattr(module, name, value)
+        return module.think(board, state)
+    return player
+
+
+def bench_expansion(games=20, iterations=200):
+    """ Score of each expansion setting of mcts_vanilla against fixed-order expansion at a small budget,
+    with the iterations per second of a search from the starting state. """
+    import mcts_vanilla
+
+    board = p2_t3.Board()
+    state0 = board.starting_state()
+    mcts_vanilla.num_nodes = iterations
+    fixed = dict(expansion_order='fixed', expand_all=False)
+    baseline = configured(mcts_vanilla, **fixed)
+    variants = [
+        ("fixed", fixed),
+        ("random", dict(expansion_order='random', expand_all=False)),
+        ("priority", dict(expansion_order='priority', expand_all=False)),
+        ("random, expand_all", dict(expansion_order='random', expand_all=True)),
+    ]
+    for name, settings in variants:
+        player = configured(mcts_vanilla, **settings)
+        for setting, value in settings.items():
+            setattr(mcts_vanilla, setting, value)
+        random.seed(0)
+        start = time()
+        mcts_vanilla.search(board, state0, iterations)
+        rate = iterations / (time() - start)
+
+        score = 0.0
+        for game in range(games):
+            if game % 2:
+                result = match(board, baseline, player)
+                score += {p2_t3.P2_WIN: 1, p2_t3.DRAW: 0.5}.get(result, 0)
+            else:
+                result = match(board, player, baseline)
+                score += {p2_t3.P1_WIN: 1, p2_t3.DRAW: 0.5}.get(result, 0)
+        print("%-20s %8.0f iterations/s  score vs fixed %4.1f / %d" % (name, rate, score, games))
+
+
+def bench_select(nodes=2000, width=81):
+    """ One selection step on wide nodes: the old loop calling ucb twice per child against
+    mcts_ucb.select_child. """
+    from math import sqrt, log
+    from mcts_node import MCTSNode
+    import mcts_ucb
+
+    def ucb(node, is_opponent):
+        natural_log = log(node.parent.visits) / log(2.71828)
+        if is_opponent:
+            exploit = 1 - (node.wins / node.visits)
+        else:
+            exploit = (node.wins / node.visits)
+        return exploit + 2 * sqrt(natural_log / node.visits)
+
+    def old_select(node, is_opponent):
+        uct_val = -1000000000
+        chosen_node = None
+        for child in node.children:
+            if ucb(child, is_opponent) > uct_val:
+                uct_val = ucb(child, is_opponent)
+                chosen_node = child
+        return chosen_node
+
+    rng = random.Random(0)
+    roots = []
+    for _ in range(nodes):
+        root = MCTSNode(action_list=[])
+        for action in range(width):
+            child = root.add_child(action, [])
+            child.visits = rng.randint(1, 200)
+            child.wins = rng.randint(0, child.visits)
+            root.visits += child.visits
+        roots.append(root)
+
+    for name, select in (("ucb twice per child", old_select),
+                         ("select_child", lambda node, is_opponent: mcts_ucb.select_child(node, is_opponent, 2))):
+        start = time()
+        for root in roots:
+            select(root, False)
+        print("%-20s %8.2f us/selection of %d children" % (name, 1e6 * (time() - start) / nodes, width))
+
+
+def bench_vector(nodes=250, repeat=10, widths=(9, 16, 32, 54, 81)):
+    """ One selection step in mcts_pool with the scalar loop against NumPy, by number of children,
+    to place mcts_pool.vector_width. """
+    import mcts_pool
+
+    rng = random.Random(0)
+    for width in widths:
+        pool = mcts_pool.NodePool()
+        pool.reserve_children(0, [(0, 0, 0, 0)] * nodes)
+        parents = range(1, nodes + 1)
+        for node in parents:
+            pool.reserve_children(node, [(0, 0, 0, 0)] * width)
+            pool.child_count[node] = width
+            for child in range(pool.first_child[node], pool.first_child[node] + width):
+                pool.visits[child] = rng.randint(1, 200)
+                pool.wins[child] = rng.randint(0, pool.visits[child])
+                pool.visits[node] += pool.visits[child]
+        times = []
+        for select in (mcts_pool.select_scalar, mcts_pool.select_vector):
+            start = time()
+            for _ in range(repeat):
+                chosen = [select(pool, node, False) for node in parents]
+            times.append(1e6 * (time() - start) / (repeat * nodes))
+        assert chosen == [mcts_pool.select_scalar(pool, node, False) for node in parents]
+        print("%3d children: scalar %7.2f us, numpy %7.2f us" % (width, times[0], times[1]))
+
+
+def bench_transposition(positions=10, iterations=5000, games=10, budget=1000):
+    """ Nodes mcts_transposition keeps against the tree of mcts_vanilla for the same iterations from
+    positions part way through random games, then its score against mcts_vanilla at a fixed budget,
+    with an unbounded table and with a small one under each eviction policy. """
+    import mcts_vanilla
+    import mcts_transposition
+
+    def tree_size(node):
+        return 1 + sum(tree_size(child) for child in node.children or ())
+
+    board = p2_t3.Board()
+    nodes = entries = transpositions = 0
+    for i in range(positions):
+        state = board.random_playout(board.starting_state(), random.Random(i), 10 + 2 * i)
+        random.seed(i)
+        root_node, _ = mcts_vanilla.search(board, state, iterations)
+        nodes += tree_size(root_node)
+        random.seed(i)
+        table, _, _ = mcts_transposition.search(board, state, iterations)
+        entries += len(table)
+        transpositions += table.transpositions
+    print("tree nodes %d  table entries %d  (%.1f%% fewer, %d transpositions)"
+          % (nodes, entries, 100 * (nodes - entries) / nodes, transpositions))
+
+    mcts_vanilla.num_nodes = budget
+    mcts_transposition.num_nodes = budget
+    for size, policy in ((budget + 1, 'lru'), (budget // 4, 'lru'), (budget // 4, 'visits')):
+        player = configured(mcts_transposition, table_size=size, eviction=policy)
+        random.seed(0)
+        score = 0.0
+        for game in range(games):
+            if game % 2:
+                result = match(board, mcts_vanilla.think, player)
+                score += {p2_t3.P2_WIN: 1, p2_t3.DRAW: 0.5}.get(result, 0)
+            else:
+                result = match(board, player, mcts_vanilla.think)
+                score += {p2_t3.P1_WIN: 1, p2_t3.DRAW: 0.5}.get(result, 0)
+        print("table_size %5d %-6s score vs mcts_vanilla %4.1f / %d" % (size, policy, score, games))
+
+
+def bench_zobrist(games=500, repeat=20):
+    """ Times hashing the states of random games three ways. That the Zobrist key PackedBoard.next_state
+    keeps agrees with one computed from scratch is checked by tests/test_p2_t3.py. """
+    board = p2_t3.PackedBoard()
+    rng = random.Random(0)
+    states = []
+    for _ in range(games):
+        state = board.starting_state()
+        while True:
+            states.append(state)
+            if board.is_ended(state):
+                break
+            state = board.next_state(state, rng.choice(board.legal_actions(state)))
+
+    tuples = [p2_t3.decode_state(state) for state in states]
+    for name, hash_state, inputs in (("PackedBoard.hash", board.hash, states),
+                                     ("Board.hash", p2_t3.Board().hash, tuples),
+                                     ("hash(tuple)", hash, tuples)):
+        start = time()
+        for _ in range(repeat):
+            for state in inputs:
+                hash_state(state)
+        print("%-17s %8.0f ns/state" % (name, 1e9 * (time() - start) / (repeat * len(inputs))))
+
+
+def bench_symmetry(games=200, repeat=5):
+    """ Times Board.canonical on every state of random games and counts how many distinct states it
+    folds together. canonical and the action maps are checked by tests/test_p2_t3.py. """
+    rng = random.Random(0)
+    for board in (p2_t3.Board(), p2_t3.PackedBoard()):
+        states = []
+        for _ in range(games):
+            state = board.starting_state()
+            while not board.is_ended(state):
+                states.append(state)
+                state = board.next_state(state, rng.choice(board.legal_actions(state)))
+
+        start = time()
+        for _ in range(repeat):
+            canonical = set(board.canonical(state)[0] for state in states)
+        elapsed = time() - start
+        print("%-12s %8.0f ns/state  %d states, %d distinct, %d canonical" % (
+            type(board).__name__, 1e9 * elapsed / (repeat * len(states)), len(states), len(set(states)),
+            len(canonical)))
+
+
+benchmarks = dict(
+    packed=bench_packed,
+    tables=bench_tables,
+    moves=bench_moves,
+    playout=bench_playout,
+    batch=bench_batch,
+    root=bench_root,
+    tree=bench_tree,
+    pool=bench_pool,
+    expansion=bench_expansion,
+    select=bench_select,
+    vector=bench_vector,
+    transposition=bench_transposition,
+    zobrist=bench_zobrist,
+    symmetry=bench_symmetry,
+)
+
+if __name__ == '__main__':
+    names = sys.argv[1:] or list(benchmarks)
+    for name in names:
+        if name not in benchmarks:
+            print("benchmark not in " + ", ".join(benchmarks))
+            exit(1)
+        print("== %s ==" % name)
+        benchmarks[name]()
@@ -0,0 +1,268 @@
+""" Leagues and sequential tests between the bots of p2_sim.player_names.
+
+    python p2_league.py mcts_vanilla mcts_modified rollout_bot --workers 4 --converge 50
+    python p2_league.py mcts_vanilla mcts_modified --sprt --elo0 0 --elo1 50
+
+A league plays rounds in which every bot meets every other with both colours,
+then rates the bots by a Bradley-Terry fit on the Elo scale with 95%
+confidence intervals. It stops after --rounds rounds, or earlier once every
+interval is narrower than --converge Elo either side.
+
+With --sprt it instead plays the first bot against the second, alternating
+colours, until a sequential probability ratio test accepts H0 (the first is
+elo0 stronger) or H1 (it is elo1 stronger) at error rates --alpha and --beta.
+
+Game i is played with seed --seed + i, so a run gives the same games for any
+number of workers. With --results every game is appended to a JSON-lines file;
+games already in it are counted again on the next run, which continues from there.
+"""
+
+import os
+import json
+import math
+import random
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import p2_sim
+import p2_log
+
+prior_draws = 1     # Virtual draws between every two bots, which keep ratings finite before a bot wins or loses
+fit_iterations = 1000
+fit_tolerance = 1e-9
+
+ELO_PER_UNIT = 400 / math.log(10)   # Elo points per unit of Bradley-Terry log-strength
+
+
+def play_record(p1: str, p2: str, seed: int):
+    """ Plays one game like p2_sim.play_game and returns its record. """
+    winner, _, seconds = p2_sim.play_game(p1, p2, seed)[:3]
+    return dict(p1=p1, p2=p2, seed=seed, winner=winner, seconds=seconds)
+
+
+def play_games(pool, games):
+    """ Plays the (p1, p2, seed) games, in the pool if there is one, and returns their records in order. """
+    if pool is None:
+        return [play_record(*game) for game in games]
+    return list(pool.map(play_record, *zip(*games)))
+
+
+def load_results(path):
+    """ Returns the game records in the JSON-lines file, or none if there is no file. """
+    if path is None or not os.path.exists(path):
+        return []
+    with open(path) as results_file:
+        return [json.loads(line) for line in results_file if line.strip()]
+
+
+def save_results(path, records):
+    """ Appends the game records to the JSON-lines file, if any. """
+    if path is not None:
+        with open(path, 'a') as results_file:
+            for record in records:
+                results_file.write(json.dumps(record) + '\n')
+
+
+def game_score(record, bot: str):
+    """ Returns the score of bot in the game: 1 for a win, 0.5 for a draw and 0 for a loss. """
+    if record['winner'] == 'draw':
+        return 0.5
+    return 1.0 if record[('p1', 'p2')[record['winner'] - 1]] == bot else 0.0
+
+
+def bradley_terry(results, bots):
+    """ Fits Bradley-Terry strengths to the games between the given bots, counting a draw as half a win for
+    each side and adding prior_draws virtual draws between every two bots.
+
+    Args:
+        results:    Game records as made by play_record.
+        bots:       The names of the bots to rate.
+
+    Returns:        For each bot its rating and the half-width of its 95% confidence interval, in Elo
+                    points, with the ratings averaging 0
+
+    """
+    n = len(bots)
+    index = dict((bot, i) for i, bot in enumerate(bots))
+    games = [[prior_draws if i != j else 0 for j in range(n)] for i in range(n)]
+    score = [prior_draws * (n - 1) / 2] * n
+    for record in results:
+        if record['p1'] in index and record['p2'] in index:
+            i, j = index[record['p1']], index[record['p2']]
+            games[i][j] += 1
+            games[j][i] += 1
+            score[i] += game_score(record, record['p1'])
+            score[j] += game_score(record, record['p2'])
+
+    # Minorization-maximization updates of the strengths gamma.
+    gamma = [1.0] * n
+    for _ in range(fit_iterations):
+        updated = [score[i] / sum(games[i][j] / (gamma[i] + gamma[j]) for j in range(n) if j != i)
+                   for i in range(n)]
+        mean_log = sum(math.log(g) for g in updated) / n
+        updated = [g / math.exp(mean_log) for g in updated]
+        change = max(abs(math.log(a / b)) for a, b in zip(updated, gamma))
+        gamma = updated
+        if change < fit_tolerance:
+            break
+    strength = [math.log(g) for g in gamma]
+
+    # The covariance of the strengths is the pseudo-inverse of the Fisher information, which is singular
+    # along the all-ones direction because only differences of strength are measured.
+    information = [[0.0] * n for _ in range(n)]
+    for i in range(n):
+        for j in range(n):
+            if i != j:
+                p = 1 / (1 + math.exp(strength[j] - strength[i]))
+                information[i][j] = -games[i][j] * p * (1 - p)
+                information[i][i] += games[i][j] * p * (1 - p)
+    covariance = invert([[information[i][j] + 1 / n for j in range(n)] for i in range(n)])
+    return [(ELO_PER_UNIT * strength[i], 1.96 * ELO_PER_UNIT * math.sqrt(max(covariance[i][i] - 1 / n, 0)))
+            for i in range(n)]
+
+
+def invert(matrix):
+    """ Returns the inverse of a square, non-singular matrix of floats by Gauss-Jordan elimination. """
+    n = len(matrix)
+    rows = [list(row) + [float(i == j) for j in range(n)] for i, row in enumerate(matrix)]
+    for column in range(n):
+        pivot = max(range(column, n), key=lambda row: abs(rows[row][column]))
+        rows[column], rows[pivot] = rows[pivot], rows[column]
+        scale = rows[column][column]
+        rows[column] = [value / scale for value in rows[column]]
+        for row in range(n):
+            if row != column and rows[row][column]:
+                factor = rows[row][column]
+                rows[row] = [a - factor * b for a, b in zip(rows[row], rows[column])]
+    return [row[n:] for row in rows]
+
+
+def print_ratings(results, bots):
+    ratings = bradley_terry(results, bots)
+    print("%-20s %8s %8s %6s %7s" % ("bot", "elo", "95% ci", "games", "score"))
+    for bot, (rating, interval) in sorted(zip(bots, ratings), key=lambda item: -item[1][0]):
+        played = [record for record in results if bot in (record['p1'], record['p2'])]
+        scored = sum(game_score(record, bot) for record in played)
+        print("%-20s %8.0f %8.0f %6d %6.1f%%" % (
+            bot, rating, interval, len(played), 100 * scored / len(played) if played else 0))
+    return ratings
+
+
+def league(bots, rounds: int, converge: float, seed: int, pool, path):
+    """ Plays up to rounds rounds of every bot against every other with both colours, printing the
+    ratings after each, and stops early once every confidence interval is within converge Elo. """
+    results = load_results(path)
+    pairings = [(p1, p2) for p1 in bots for p2 in bots if p1 != p2]
+    for league_round in range(rounds):
+        start = len(results)
+        games = [(p1, p2, seed + start + k) for k, (p1, p2) in enumerate(pairings)]
+        played = play_games(pool, games)
+        save_results(path, played)
+        results.extend(played)
+
+        print("")
+        print("Round %d: %d games, %.1f s of play" % (
+            league_round, len(played), sum(record['seconds'] for record in played)))
+        ratings = print_ratings(results, bots)
+        if converge is not None and max(interval for _, interval in ratings) <= converge:
+            print("Ratings converged to within %g Elo." % converge)
+            break
+
+
+def expected_score(elo: float):
+    """ Returns the expected score of a bot elo Elo points stronger than its opponent. """
+    return 1 / (1 + 10 ** (-elo / 400))
+
+
+def log_likelihood_ratio(scores, elo0: float, elo1: float):
+    """ Returns the log-likelihood ratio of H1 (elo1 stronger) against H0 (elo0 stronger) for the
+    given game scores, by the normal approximation to the distribution of the mean score. One virtual
+    win and one virtual loss are added, so a run of equal results still has a variance. """
+    scores = list(scores) + [0.0, 1.0]
+    n = len(scores)
+    mean = sum(scores) / n
+    variance = sum(score * score for score in scores) / n - mean * mean
+    s0, s1 = expected_score(elo0), expected_score(elo1)
+    return n * (s1 - s0) * (2 * mean - s0 - s1) / (2 * variance)
+
+
+def sprt(bot: str, opponent: str, elo0: float, elo1: float, alpha: float, beta: float, max_games: int,
+         seed: int, pool, workers: int, path):
+    """ Plays bot against opponent, alternating colours, until the SPRT of H1: bot is elo1 Elo stronger
+    against H0: bot is elo0 Elo stronger accepts one of them, or max_games games have been played.
+
+    Games are played in batches of two per worker and the test is applied after every game in order,
+    so it stops at the same game for any number of workers; games of the batch after that one are dropped.
+    """
+    lower, upper = math.log(beta / (1 - alpha)), math.log((1 - beta) / alpha)
+    results = [record for record in load_results(path) if {record['p1'], record['p2']} == {bot, opponent}]
+    scores = [game_score(record, bot) for record in results]
+    batch = 2 * max(1, workers)
+    llr = log_likelihood_ratio(scores, elo0, elo1)
+    print("SPRT %s vs %s: H0 elo %g, H1 elo %g, bounds [%.2f, %.2f]" % (bot, opponent, elo0, elo1, lower, upper))
+
+    while lower < llr < upper and len(scores) < max_games:
+        start = len(scores)
+        games = [(bot, opponent) if (start + k) % 2 == 0 else (opponent, bot)
+                 for k in range(min(batch, max_games - start))]
+        played = play_games(pool, [(p1, p2, seed + start + k) for k, (p1, p2) in enumerate(games)])
+        for record in played:
+            results.append(record)
+            scores.append(game_score(record, bot))
+            llr = log_likelihood_ratio(scores, elo0, elo1)
+            save_results(path, [record])
+            if not lower < llr < upper:
+                break
+        print("%d games, score %.1f%%, LLR %.2f" % (len(scores), 100 * sum(scores) / len(scores), llr))
+
+    if llr >= upper:
+        print("H1 accepted: %s is stronger by %g Elo." % (bot, elo1))
+    elif llr <= lower:
+        print("H0 accepted: %s is not stronger by %g Elo." % (bot, elo1))
+    else:
+        print("No decision after %d games." % len(scores))
+    print_ratings(results, [bot, opponent])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rates bots of p2_sim.player_names against each other.")
+    parser.add_argument('bots', nargs='+', choices=p2_sim.player_names)
+    parser.add_argument('--rounds', type=int, default=10,
+                        help="most rounds of every pairing with both colours (default 10)")
+    parser.add_argument('--converge', type=float, default=None,
+                        help="stop once every 95%% interval is within this many Elo either side")
+    parser.add_argument('--sprt', action='store_true', help="test whether the first bot is stronger than the second")
+    parser.add_argument('--elo0', type=float, default=0, help="Elo difference under H0 (default 0)")
+    parser.add_argument('--elo1', type=float, default=50, help="Elo difference under H1 (default 50)")
+    parser.add_argument('--alpha', type=float, default=0.05, help="false positive rate (default 0.05)")
+    parser.add_argument('--beta', type=float, default=0.05, help="false negative rate (default 0.05)")
+    parser.add_argument('--max-games', type=int, default=1000, help="most games for --sprt (default 1000)")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="worker processes playing games at once; 1 plays them in this process (default 1)")
+    parser.add_argument('--seed', type=int, default=None,
+                        help="game i is played with seed SEED + i; a random SEED is drawn and shown if not given")
+    parser.add_argument('--results', default=None, help="JSON-lines file the games are appended to and read from")
+    args = parser.parse_args()
+
+    if len(set(args.bots)) < 2 or (args.sprt and len(args.bots) != 2):
+        parser.error("a league needs two or more different bots, and --sprt exactly two")
+    seed = random.getrandbits(32) if args.seed is None else args.seed
+    print("Seed: %d" % seed)
+
+    # The bots' per-move lines would drown the ratings.
+    p2_log.configure('WARNING')
+    pool = None
+    if args.workers > 1:
+        pool = ProcessPoolExecutor(max_workers=args.workers, initializer=p2_log.configure, initargs=('WARNING',))
+    try:
+        if args.sprt:
+            sprt(args.bots[0], args.bots[1], args.elo0, args.elo1, args.alpha, args.beta, args.max_games,
+                 seed, pool, args.workers, args.results)
+        else:
+            league(args.bots, args.rounds, args.converge, seed, pool, args.results)
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+
+if __name__ == '__main__':
+    main()
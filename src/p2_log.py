@@ -0,0 +1,39 @@
+""" Logging setup shared by the command-line scripts.
+
+Every bot module logs through logging.getLogger(__name__) with lazy %-style
+arguments, so a message below its logger's level costs one level check and no
+formatting. The level of each bot is set by the name of its module:
+
+    configure('WARNING', {'mcts_vanilla': 'INFO'})
+
+shows only the per-move lines of mcts_vanilla (and of the bots built on it,
+such as mcts_vanilla_reuse) and warnings from everything else.
+"""
+
+import sys
+import logging
+
+
+def configure(level='INFO', bot_levels=None):
+    """ Sends log messages at or above level, as bare lines, to stdout, with the given module name -> level
+    overrides. Safe to call again, for instance in each worker process of a pool. """
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(logging.Formatter('%(message)s'))
+    root.addHandler(handler)
+    root.setLevel(level)
+    for name, bot_level in (bot_levels or {}).items():
+        logging.getLogger(name).setLevel(bot_level)
+
+
+def parse_bot_levels(settings):
+    """ Turns NAME=LEVEL strings into a name -> level dictionary, raising ValueError on any other form. """
+    levels = {}
+    for setting in settings or ():
+        name, separator, level = setting.partition('=')
+        if not separator or not name or not isinstance(logging.getLevelName(level.upper()), int):
+            raise ValueError("expected NAME=LEVEL, got %r" % setting)
+        levels[name] = level.upper()
+    return levels
@@ -1,5 +1,6 @@
 import sys
 import p2_t3
+import p2_log
 import mcts_vanilla
 import mcts_modified
 import random_bot
@@ -26,6 +27,7 @@ players = dict(
 
 board = p2_t3.Board()
 state0 = board.starting_state()
+p2_log.configure('INFO')
 
 if len(sys.argv) != 3:
     print("Need two player arguments")
@@ -1,67 +1,173 @@
-import sys
+import random
+import inspect
+import logging
+import argparse
+from concurrent.futures import ProcessPoolExecutor
 from timeit import default_timer as time
 import p2_t3
 import mcts_vanilla
 import mcts_modified
+import mcts_pool
+import mcts_transposition
 import random_bot
 import rollout_bot
+import p2_telemetry
+import p2_log
+from mcts_profile import Profiler
 
 players = dict(
     random_bot=random_bot.think,
     rollout_bot=rollout_bot.think,
     mcts_vanilla=mcts_vanilla.think,
     mcts_modified=mcts_modified.think,
+    mcts_vanilla_root=mcts_vanilla.think_root_parallel,
+    mcts_modified_root=mcts_modified.think_root_parallel,
+    mcts_vanilla_tree=mcts_vanilla.think_tree_parallel,
+    mcts_pool=mcts_pool.think,
+    mcts_transposition=mcts_transposition.think,
 )
 
+# Players that keep state between their moves: each side of each game gets a fresh session.
+sessions = dict(
+    mcts_vanilla_reuse=mcts_vanilla.SearchSession,
+)
+
+player_names = list(players) + list(sessions)
+
 board = p2_t3.Board()
 state0 = board.starting_state()
 
-if len(sys.argv) != 3:
-    print("Need two player arguments")
-    exit(1)
+logger = logging.getLogger(__name__)
 
-p1 = sys.argv[1]
-if p1 not in players:
-    print("p1 not in "+players.keys().join(","))
-    exit(1)
-p2 = sys.argv[2]
-if p2 not in players:
-    print("p2 not in "+players.keys().join(","))
-    exit(1)
 
-player1 = players[p1]
-player2 = players[p2]
+def new_player(name: str):
+    """ Returns the think function of the named player, with a new session if it is one of sessions. """
+    return sessions[name]().think if name in sessions else players[name]
 
-rounds = 100
-wins = {'draw':0, 1:0, 2:0}
 
-start = time()  # To log how much time the simulation takes.
-for i in range(rounds):
+def play_game(p1: str, p2: str, seed: int, telemetry: bool = False, profile: bool = False):
+    """ Plays one game between the named players, with the random module seeded with seed first,
+    so the game is the same whichever process plays it.
 
-    print("")
-    print("Round %d, fight!" % i)
+    Returns:    The winner (1, 2 or 'draw'), the final points, the seconds the game took, the
+                p2_telemetry records of its moves if telemetry is set (else an empty list) and, if
+                profile is set, a Profiler for each side (1 or 2) whose think takes one (else none)
+
+    """
+    random.seed(seed)
+    if telemetry:
+        p2_telemetry.start()
+    names = {1: p1, 2: p2}
+    thinks = {1: new_player(p1), 2: new_player(p2)}
+    profilers = {}
+    if profile:
+        for side, think in thinks.items():
+            if 'profiler' in inspect.signature(think).parameters:
+                profilers[side] = Profiler()
+    start = time()
 
     state = state0
     last_action = None
-    current_player = player1
     while not board.is_ended(state):
-        last_action = current_player(board, state)
+        side = board.current_player(state)
+        if telemetry:
+            p2_telemetry.set_context(seed=seed, player=names[side], side=side)
+        if side in profilers:
+            last_action = thinks[side](board, state, profiler=profilers[side])
+        else:
+            last_action = thinks[side](board, state)
         state = board.next_state(state, last_action)
-        current_player = player1 if current_player == player2 else player2
-    print("Finished!")
-    print()
+    elapsed = time() - start
+    records = p2_telemetry.stop() if telemetry else []
     final_score = board.points_values(state)
     winner = 'draw'
     if final_score[1] == 1:
         winner = 1
     elif final_score[2] == 1:
         winner = 2
-    print("The %s bot wins this round! (%s)" % (winner, str(final_score)))
-    wins[winner] = wins.get(winner, 0) + 1
+    return winner, final_score, elapsed, records, profilers
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Plays rounds of Ultimate Tic-Tac-Toe between two bots.")
+    parser.add_argument('p1', choices=player_names)
+    parser.add_argument('p2', choices=player_names)
+    parser.add_argument('--rounds', type=int, default=100, help="number of games to play (default 100)")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="worker processes playing games at once; 1 plays them in this process (default 1)")
+    parser.add_argument('--seed', type=int, default=None,
+                        help="round i is played with seed SEED + i; a random SEED is drawn and shown if not given")
+    parser.add_argument('--telemetry', default=None,
+                        help="JSON-lines file to append the telemetry of every move to; summarized at the end")
+    parser.add_argument('--profile', action='store_true',
+                        help="time each phase of the MCTS bots' searches and print a breakdown at the end")
+    parser.add_argument('--summary', action='store_true',
+                        help="print only the seed and the final summary, not the rounds or the bots' moves")
+    parser.add_argument('--log-level', default='INFO', choices=('DEBUG', 'INFO', 'WARNING', 'ERROR'),
+                        help="level of the log lines shown (default INFO)")
+    parser.add_argument('--bot-log', action='append', default=[], metavar='MODULE=LEVEL',
+                        help="log level for one bot module, e.g. mcts_vanilla=WARNING; may be repeated")
+    args = parser.parse_args()
+    try:
+        bot_levels = p2_log.parse_bot_levels(args.bot_log)
+    except ValueError as error:
+        parser.error(str(error))
+    level = 'WARNING' if args.summary else args.log_level
+    p2_log.configure(level, bot_levels)
+
+    seed = random.getrandbits(32) if args.seed is None else args.seed
+    print("Seed: %d" % seed)
+    seeds = [seed + i for i in range(args.rounds)]
+    telemetry = args.telemetry is not None
+    move_records = []
+    profilers = {}
+    wins = {'draw':0, 1:0, 2:0}
+    game_times = []
+
+    start = time()  # To log how much time the simulation takes.
+    if args.workers > 1:
+        pool = ProcessPoolExecutor(max_workers=args.workers, initializer=p2_log.configure,
+                                   initargs=(level, bot_levels))
+        results = pool.map(play_game, [args.p1] * args.rounds, [args.p2] * args.rounds, seeds,
+                           [telemetry] * args.rounds, [args.profile] * args.rounds)
+    else:
+        pool = None
+        results = (play_game(args.p1, args.p2, game_seed, telemetry, args.profile) for game_seed in seeds)
+
+    for i, (winner, final_score, elapsed, records, game_profilers) in enumerate(results):
+        logger.info("")
+        logger.info("Round %d (seed %d) finished in %.2f s", i, seeds[i], elapsed)
+        logger.info("The %s bot wins this round! (%s)", winner, final_score)
+        wins[winner] = wins.get(winner, 0) + 1
+        game_times.append(elapsed)
+        if telemetry:
+            p2_telemetry.write(args.telemetry, records)
+            move_records.extend(records)
+        for side, profiler in game_profilers.items():
+            profilers.setdefault(side, Profiler()).merge(profiler)
+    if pool is not None:
+        pool.shutdown()
+
+    print("")
+    print("Final win counts:", dict(wins))
+    if game_times:
+        print("Game time: mean %.2f s, min %.2f s, max %.2f s" % (
+            sum(game_times) / len(game_times), min(game_times), max(game_times)))
+    if move_records:
+        p2_telemetry.summarize(move_records)
+    if args.profile:
+        for side, name in ((1, args.p1), (2, args.p2)):
+            print("")
+            if side in profilers:
+                print("Search phases of player %d (%s):" % (side, name))
+                print(profilers[side].breakdown())
+            else:
+                print("Player %d (%s) takes no profiler." % (side, name))
+
+    # Also output the time elapsed.
+    end = time()
+    print(end - start, ' seconds')
 
-print("")
-print("Final win counts:", dict(wins))
 
-# Also output the time elapsed.
-end = time()
-print(end - start, ' seconds')
+if __name__ == '__main__':
+    main()
@@ -18,6 +18,11 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
 # THE SOFTWARE.
 
+import random
+from p2_t3_tables import has_line, is_full, cells, actions, free_actions
+from p2_t3_tables import zobrist_pieces, zobrist_boards, zobrist_constraint, zobrist_player
+from p2_t3_tables import symmetry_cells, symmetry_masks, inverse_symmetry
+
 num_players = 2
 
 positions = dict(
@@ -30,6 +35,12 @@ inv_positions = dict(
     (v, P) for P, v in positions.items()
 )
 
+# Results of the big board, as returned by outcome().
+ONGOING, P1_WIN, P2_WIN, DRAW = range(4)
+
+outcome_win_values = (None, {1: 1, 2: 0}, {1: 0, 2: 1}, {1: 0.5, 2: 0.5})
+outcome_points_values = (None, {1: 1, 2: -1}, {1: -1, 2: 1}, {1: 0, 2: 0})
+
 class Board(object):
     wins = [
         positions[(r, 0)] | positions[(r, 1)] | positions[(r, 2)]
@@ -194,10 +205,9 @@ class Board(object):
         state[board_index + player_index] |= positions[(r, c)]
         updated_board = state[board_index + player_index]
 
-        full = (state[board_index] | state[board_index + 1] == 0x1ff)
-        if any(updated_board & w == w for w in self.wins):
+        if has_line[updated_board]:
             state[18 + player_index] |= positions[(R, C)]
-        elif full:
+        elif is_full[state[board_index] | state[board_index + 1]]:
             state[18] |= positions[(R, C)]
             state[19] |= positions[(R, C)]
 
@@ -238,60 +248,182 @@ class Board(object):
         # Otherwise, we must play in the proper sub-board.
         return (R, C) == (state[20], state[21])
 
+    def captures(self, state, action):
+        """ Returns whether the legal action wins its sub-board for the player to move. """
+        R, C, r, c = action
+        return has_line[state[2 * (3 * R + C) + state[-1] - 1] | positions[(r, c)]]
+
     def legal_actions(self, state):
-        R, C = state[20], state[21]
-        Rset, Cset = (R,), (C,)
-        if R is None:
-            Rset, Cset = range(3), range(3)
-
-        occupied = [
-            state[2 * x] | state[2 * x + 1] for x in range(9)
-        ]
+        R = state[20]
         finished = state[18] | state[19]
 
-        actions = [
-            (R, C, r, c)
-            for R in Rset
-            for C in Cset
-            for r in range(3)
-            for c in range(3)
-            if not occupied[3 * R + C] & positions[(r, c)]
-            and not finished & positions[(R, C)]
-        ]
+        if R is not None:
+            board = 3 * R + state[21]
+            if finished & (1 << board):
+                return []
+            return list(free_actions[board][state[2 * board] | state[2 * board + 1]])
 
+        actions = []
+        for board in range(9):
+            if not finished & (1 << board):
+                actions.extend(free_actions[board][state[2 * board] | state[2 * board + 1]])
         return actions
 
+    def legal_mask(self, state):
+        """ Returns the legal actions as a bitmask with bit 9 * (3 * R + C) + 3 * r + c set
+        for each legal (R, C, r, c). Pick one with choose_action. """
+        R = state[20]
+        finished = state[18] | state[19]
+        boards = range(9) if R is None else (3 * R + state[21],)
+
+        mask = 0
+        for board in boards:
+            if not finished & (1 << board):
+                mask |= (~(state[2 * board] | state[2 * board + 1]) & 0x1ff) << (9 * board)
+        return mask
+
+    def random_playout(self, state, rng=random, max_depth=None, greedy=False):
+        """ Plays uniformly random moves from state until the game ends or max_depth moves
+        have been made, and returns the state reached.
+
+        Args:
+            state:      The state to play from.
+            rng:        A random.Random (or the random module) to draw the moves from.
+            max_depth:  The most moves to play, or None to play to the end.
+            greedy:     Whether to take a move that wins a sub-board for the player to
+                        move, when there is one, instead of a random move.
+
+        Returns:        The state reached, in this board's layout.
+
+        """
+        rand = rng.random
+        masks = list(state[:18])
+        p1_boards, p2_boards = state[18], state[19]
+        constraint = None if state[20] is None else 3 * state[20] + state[21]
+        player_index = state[22] - 1
+        result = outcome(p1_boards, p2_boards)
+
+        depth = 0
+        while result == ONGOING and depth != max_depth:
+            depth += 1
+            finished = p1_boards | p2_boards
+
+            if constraint is not None:
+                board = constraint
+                free = cells[(masks[2 * board] | masks[2 * board + 1]) ^ 0x1ff]
+                choices = ((board, free),)
+                count = len(free)
+            else:
+                choices = []
+                count = 0
+                for board in range(9):
+                    if not finished & (1 << board):
+                        free = cells[(masks[2 * board] | masks[2 * board + 1]) ^ 0x1ff]
+                        choices.append((board, free))
+                        count += len(free)
+
+            cell = None
+            if greedy:
+                for board, free in choices:
+                    mine = masks[2 * board + player_index]
+                    for i in free:
+                        if has_line[mine | (1 << i)]:
+                            cell = i
+                            break
+                    if cell is not None:
+                        break
+            if cell is None:
+                k = int(rand() * count)
+                for board, free in choices:
+                    if k < len(free):
+                        cell = free[k]
+                        break
+                    k -= len(free)
+
+            index = 2 * board + player_index
+            masks[index] |= 1 << cell
+            if has_line[masks[index]]:
+                if player_index:
+                    p2_boards |= 1 << board
+                else:
+                    p1_boards |= 1 << board
+                result = outcome(p1_boards, p2_boards)
+            elif is_full[masks[2 * board] | masks[2 * board + 1]]:
+                p1_boards |= 1 << board
+                p2_boards |= 1 << board
+                result = outcome(p1_boards, p2_boards)
+
+            constraint = None if (p1_boards | p2_boards) & (1 << cell) else cell
+            player_index ^= 1
+
+        masks.extend((p1_boards, p2_boards))
+        masks.extend((None, None) if constraint is None else divmod(constraint, 3))
+        masks.append(player_index + 1)
+        return tuple(masks)
+
     def previous_player(self, state):
         return 3 - state[-1]
 
     def current_player(self, state):
         return state[-1]
 
-    def is_ended(self, state):
-        p1 = state[18] & ~state[19]
-        p2 = state[19] & ~state[18]
+    def result(self, state):
+        """ Returns ONGOING, P1_WIN, P2_WIN or DRAW for the given state. """
+        return outcome(state[18], state[19])
 
-        if any(w & p1 == w for w in self.wins):
-            return True
-        if any(w & p2 == w for w in self.wins):
-            return True
-        if state[18] | state[19] == 0x1ff:
-            return True
+    def is_ended(self, state):
+        return outcome(state[18], state[19]) != ONGOING
+
+    def hash(self, state):
+        """ Returns the 64-bit Zobrist key of the state: the XOR of the keys of its pieces, its closed
+        sub-boards, its required board and, when player 2 is to move, the player. States reached by
+        different move orders get the same key. """
+        return zobrist_key(state)
+
+    def transform(self, state, symmetry):
+        """ Returns the image of the state under the symmetry with the given index into
+        p2_t3_tables.symmetries, which moves the sub-boards and the cells of each alike. """
+        perm, masks = symmetry_cells[symmetry], symmetry_masks[symmetry]
+        image = [0] * 18
+        for board in range(9):
+            field = 2 * perm[board]
+            image[field] = masks[state[2 * board]]
+            image[field + 1] = masks[state[2 * board + 1]]
+        image.append(masks[state[18]])
+        image.append(masks[state[19]])
+        if state[20] is None:
+            image.extend((None, None))
+        else:
+            image.extend(divmod(perm[3 * state[20] + state[21]], 3))
+        image.append(state[22])
+        return tuple(image)
+
+    def canonical(self, state):
+        """ Returns the least of the eight images of the state under the symmetries of the board, which
+        is the same for all of them, and the index of the symmetry that maps the state to it. Map actions
+        with transform_action and untransform_action. """
+        best = state
+        best_symmetry = 0
+        for symmetry in range(1, 8):
+            # All images share the player and whether a board is required, so never compare None with an int.
+            image = Board.transform(self, state, symmetry)
+            if image < best:
+                best, best_symmetry = image, symmetry
+        return best, best_symmetry
+
+    def transform_action(self, action, symmetry):
+        """ Returns the image of the action under the symmetry, as taken by Board.transform. """
+        R, C, r, c = action
+        perm = symmetry_cells[symmetry]
+        return divmod(perm[3 * R + C], 3) + divmod(perm[3 * r + c], 3)
 
-        return False
+    def untransform_action(self, action, symmetry):
+        """ Returns the action whose image under the symmetry is the given action. """
+        return self.transform_action(action, inverse_symmetry[symmetry])
 
     def win_values(self, state):
-        if not self.is_ended(state):
-            return
-        p1 = state[18] & ~state[19]
-        p2 = state[19] & ~state[18]
-
-        if any(w & p1 == w for w in self.wins):
-            return {1: 1, 2: 0}
-        if any(w & p2 == w for w in self.wins):
-            return {1: 0, 2: 1}
-        if state[18] | state[19] == 0x1ff:
-            return {1: 0.5, 2: 0.5}
+        values = outcome_win_values[self.result(state)]
+        return values and dict(values)
 
     def owned_boxes(self, state):
         p1 = state[18] & ~state[19]
@@ -308,17 +440,8 @@ class Board(object):
         return ret
         
     def points_values(self, state):
-        if not self.is_ended(state):
-            return
-        p1 = state[18] & ~state[19]
-        p2 = state[19] & ~state[18]
-
-        if any(w & p1 == w for w in self.wins):
-            return {1: 1, 2: -1}
-        if any(w & p2 == w for w in self.wins):
-            return {1: -1, 2: 1}
-        if state[18] | state[19] == 0x1ff:
-            return {1: 0, 2: 0}
+        values = outcome_points_values[self.result(state)]
+        return values and dict(values)
 
     def winner_message(self, winners):
         winners = sorted((v, k) for k, v in winners.items())
@@ -326,3 +449,229 @@ class Board(object):
         if value == 0.5:
             return "Draw."
         return "Winner: Player {0}.".format(winner)
+
+
+def outcome(p1_boards, p2_boards):
+    """ Returns ONGOING, P1_WIN, P2_WIN or DRAW for the given big-board bitmasks. """
+    if has_line[p1_boards & ~p2_boards]:
+        return P1_WIN
+    if has_line[p2_boards & ~p1_boards]:
+        return P2_WIN
+    if is_full[p1_boards | p2_boards]:
+        return DRAW
+    return ONGOING
+
+
+def zobrist_key(state):
+    """ Computes Board.hash from scratch for a state in the tuple layout of Board. """
+    key = 0
+    for field in range(18):
+        for cell in cells[state[field]]:
+            key ^= zobrist_pieces[9 * field + cell]
+    for player_index in range(2):
+        for board in cells[state[18 + player_index]]:
+            key ^= zobrist_boards[9 * player_index + board]
+    if state[20] is not None:
+        key ^= zobrist_constraint[3 * state[20] + state[21]]
+    if state[22] == 2:
+        key ^= zobrist_player
+    return key
+
+
+def choose_action(mask, rng=random):
+    """ Returns a uniformly random action from a legal-move bitmask made by Board.legal_mask,
+    or None when the mask is empty. rng is a random.Random or the random module itself. """
+    count = mask.bit_count()
+    if not count:
+        return None
+    k = int(rng.random() * count)
+    base = 0
+    while True:
+        chunk = mask & 0x1ff
+        set_cells = cells[chunk]
+        if k < len(set_cells):
+            return actions[base + set_cells[k]]
+        k -= len(set_cells)
+        mask >>= 9
+        base += 9
+
+
+# Layout of a packed state. Each of the 20 bitmasks of the tuple layout takes
+# 9 bits at 9 * (its tuple index), followed by the required board as
+# 3 * row + column (NO_CONSTRAINT when free), the player to move (0 for
+# player 1, 1 for player 2) and the result of the game as given by outcome(),
+# which next_state updates whenever a sub-board is decided.
+META_SHIFT = 9 * 18
+CONSTRAINT_SHIFT = 9 * 20
+PLAYER_SHIFT = CONSTRAINT_SHIFT + 4
+RESULT_SHIFT = PLAYER_SHIFT + 1
+NO_CONSTRAINT = 9
+CONSTRAINT_MASK = 0xf << CONSTRAINT_SHIFT
+ZOBRIST_SHIFT = 192
+
+# The Zobrist keys moved up to ZOBRIST_SHIFT, so that next_state can XOR them straight into a packed state.
+_piece_keys = tuple(key << ZOBRIST_SHIFT for key in zobrist_pieces)
+_board_keys = tuple(key << ZOBRIST_SHIFT for key in zobrist_boards)
+_constraint_keys = tuple(key << ZOBRIST_SHIFT for key in zobrist_constraint) + (0,)  # None for NO_CONSTRAINT
+# The change of key of a move from required board old to required board new, including the side to move.
+_turn_keys = tuple(
+    tuple(_constraint_keys[old] ^ _constraint_keys[new] ^ (zobrist_player << ZOBRIST_SHIFT) for new in range(10))
+    for old in range(10)
+)
+
+
+def encode_state(state):
+    """ Packs a state in the tuple layout of Board into a single int. """
+    code = 0
+    for i in range(20):
+        code |= state[i] << (9 * i)
+    if state[20] is None:
+        code |= NO_CONSTRAINT << CONSTRAINT_SHIFT
+    else:
+        code |= (3 * state[20] + state[21]) << CONSTRAINT_SHIFT
+    code |= (state[22] - 1) << PLAYER_SHIFT
+    code |= outcome(state[18], state[19]) << RESULT_SHIFT
+    code |= zobrist_key(state) << ZOBRIST_SHIFT
+    return code
+
+
+def decode_state(code):
+    """ Unpacks an int made by encode_state back into the tuple layout of Board. """
+    state = [(code >> (9 * i)) & 0x1ff for i in range(20)]
+    constraint = (code >> CONSTRAINT_SHIFT) & 0xf
+    if constraint == NO_CONSTRAINT:
+        state.extend((None, None))
+    else:
+        state.extend(divmod(constraint, 3))
+    state.append(((code >> PLAYER_SHIFT) & 1) + 1)
+    return tuple(state)
+
+
+class PackedBoard(Board):
+    """ The same game as Board, with each state packed into a single int.
+
+    Bots only go through the Board methods, so either board can be handed to
+    them. Use encode_state and decode_state to move between the two layouts.
+
+    The bits from ZOBRIST_SHIFT up hold the Zobrist key of the state, which
+    next_state updates as it goes, so hash is a shift.
+    """
+
+    def starting_state(self):
+        return NO_CONSTRAINT << CONSTRAINT_SHIFT
+
+    def display(self, state, action, _unicode=True):
+        return Board.display(self, decode_state(state), action, _unicode)
+
+    def pack_state(self, data):
+        return encode_state(Board.pack_state(self, data))
+
+    def unpack_state(self, state):
+        return Board.unpack_state(self, decode_state(state))
+
+    def next_state(self, state, action):
+        R, C, r, c = action
+        board = 3 * R + C
+        player_index = (state >> PLAYER_SHIFT) & 1
+        shift = 9 * (2 * board + player_index)
+
+        cell = 3 * r + c
+        state ^= 1 << PLAYER_SHIFT
+        state |= 1 << (shift + cell)
+        state ^= _piece_keys[shift + cell]
+        updated_board = (state >> shift) & 0x1ff
+
+        occupied = (state >> (18 * board)) | (state >> (18 * board + 9))
+        if has_line[updated_board]:
+            state |= 1 << (META_SHIFT + 9 * player_index + board)
+            state ^= _board_keys[9 * player_index + board]
+            state |= outcome(*self.meta_boards(state)) << RESULT_SHIFT
+        elif is_full[occupied & 0x1ff]:
+            state |= (1 << (META_SHIFT + board)) | (1 << (META_SHIFT + 9 + board))
+            state ^= _board_keys[board] ^ _board_keys[9 + board]
+            state |= outcome(*self.meta_boards(state)) << RESULT_SHIFT
+
+        finished = (state >> META_SHIFT) | (state >> (META_SHIFT + 9))
+        if finished & (1 << cell):
+            cell = NO_CONSTRAINT
+        state ^= _turn_keys[(state >> CONSTRAINT_SHIFT) & 0xf][cell]
+        return (state & ~CONSTRAINT_MASK) | (cell << CONSTRAINT_SHIFT)
+
+    def is_legal(self, state, action):
+        R, C, r, c = action
+
+        if (R, C) not in positions or (r, c) not in positions:
+            return False
+
+        board = 3 * R + C
+        occupied = (state >> (18 * board)) | (state >> (18 * board + 9))
+        if occupied & positions[(r, c)]:
+            return False
+
+        finished = (state >> META_SHIFT) | (state >> (META_SHIFT + 9))
+        if finished & positions[(R, C)]:
+            return False
+
+        constraint = (state >> CONSTRAINT_SHIFT) & 0xf
+        return constraint == NO_CONSTRAINT or constraint == board
+
+    def captures(self, state, action):
+        R, C, r, c = action
+        shift = 9 * (2 * (3 * R + C) + ((state >> PLAYER_SHIFT) & 1))
+        return has_line[((state >> shift) & 0x1ff) | positions[(r, c)]]
+
+    def legal_actions(self, state):
+        constraint = (state >> CONSTRAINT_SHIFT) & 0xf
+        boards = range(9) if constraint == NO_CONSTRAINT else (constraint,)
+        finished = (state >> META_SHIFT) | (state >> (META_SHIFT + 9))
+
+        actions = []
+        for board in boards:
+            if not finished & (1 << board):
+                occupied = ((state >> (18 * board)) | (state >> (18 * board + 9))) & 0x1ff
+                actions.extend(free_actions[board][occupied])
+        return actions
+
+    def legal_mask(self, state):
+        constraint = (state >> CONSTRAINT_SHIFT) & 0xf
+        boards = range(9) if constraint == NO_CONSTRAINT else (constraint,)
+        finished = (state >> META_SHIFT) | (state >> (META_SHIFT + 9))
+
+        mask = 0
+        for board in boards:
+            if not finished & (1 << board):
+                occupied = (state >> (18 * board)) | (state >> (18 * board + 9))
+                mask |= (~occupied & 0x1ff) << (9 * board)
+        return mask
+
+    def previous_player(self, state):
+        return 2 - ((state >> PLAYER_SHIFT) & 1)
+
+    def current_player(self, state):
+        return ((state >> PLAYER_SHIFT) & 1) + 1
+
+    def meta_boards(self, state):
+        """ Returns the big-board bitmasks of player 1 and player 2. """
+        return (state >> META_SHIFT) & 0x1ff, (state >> (META_SHIFT + 9)) & 0x1ff
+
+    def result(self, state):
+        return (state >> RESULT_SHIFT) & 3
+
+    def is_ended(self, state):
+        return (state >> RESULT_SHIFT) & 3 != ONGOING
+
+    def hash(self, state):
+        return state >> ZOBRIST_SHIFT
+
+    def transform(self, state, symmetry):
+        return encode_state(Board.transform(self, decode_state(state), symmetry))
+
+    def canonical(self, state):
+        canonical_state, symmetry = Board.canonical(self, decode_state(state))
+        return encode_state(canonical_state), symmetry
+
+    def owned_boxes(self, state):
+        return Board.owned_boxes(self, decode_state(state))
+
+    def random_playout(self, state, rng=random, max_depth=None, greedy=False):
+        return encode_state(Board.random_playout(self, decode_state(state), rng, max_depth, greedy))
@@ -0,0 +1,90 @@
+""" Lookup tables over the 512 possible 9-bit masks of a 3x3 board, built at import time.
+
+Bit 3 * r + c of a mask is the cell at row r and column c, as in p2_t3.positions.
+"""
+
+import random
+
+# The eight winning lines: three rows, three columns and the two diagonals.
+wins = [
+    0b111 << (3 * r) for r in range(3)
+] + [
+    0b001001001 << c for c in range(3)
+] + [
+    0b100010001,
+    0b001010100,
+]
+
+# Whether each mask holds at least one complete line.
+has_line = tuple(any(mask & w == w for w in wins) for mask in range(512))
+
+# Whether each mask covers the whole board.
+is_full = tuple(mask == 0x1ff for mask in range(512))
+
+# The cell indices set in each mask, in increasing order.
+cells = tuple(tuple(i for i in range(9) if mask & (1 << i)) for mask in range(512))
+
+# The action (R, C, r, c) for each bit 9 * (3 * R + C) + 3 * r + c of a legal-move mask.
+actions = tuple(
+    (R, C, r, c)
+    for R in range(3)
+    for C in range(3)
+    for r in range(3)
+    for c in range(3)
+)
+
+# For each sub-board and mask of occupied cells, the actions on its free cells
+# in the order Board.legal_actions lists them.
+free_actions = tuple(
+    tuple(
+        tuple(actions[9 * board + i] for i in cells[occupied ^ 0x1ff])
+        for occupied in range(512)
+    )
+    for board in range(9)
+)
+
+# Random 64-bit Zobrist keys, fixed by the seed so keys agree between runs and processes.
+_zobrist = random.Random(0x5eed)
+
+# The key of a piece in each cell of each of the 18 sub-board masks of a state, at 9 * field + cell.
+zobrist_pieces = tuple(_zobrist.getrandbits(64) for _ in range(18 * 9))
+
+# The key of each bit of the two big-board masks of a state, at 9 * player index + board.
+zobrist_boards = tuple(_zobrist.getrandbits(64) for _ in range(2 * 9))
+
+# The key of each required board 3 * R + C; a free choice of board has none.
+zobrist_constraint = tuple(_zobrist.getrandbits(64) for _ in range(9))
+
+# The key of player 2 being to move.
+zobrist_player = _zobrist.getrandbits(64)
+
+# The eight symmetries of the square as maps (r, c) -> (r', c'): the four rotations, then the
+# four reflections. Each applies both to the sub-boards of the big board and to the cells of each.
+symmetries = (
+    lambda r, c: (r, c),
+    lambda r, c: (c, 2 - r),
+    lambda r, c: (2 - r, 2 - c),
+    lambda r, c: (2 - c, r),
+    lambda r, c: (r, 2 - c),
+    lambda r, c: (2 - r, c),
+    lambda r, c: (c, r),
+    lambda r, c: (2 - c, 2 - r),
+)
+
+# The cell 3 * r' + c' each symmetry takes the cell 3 * r + c to.
+symmetry_cells = tuple(
+    tuple(3 * symmetry(r, c)[0] + symmetry(r, c)[1] for r in range(3) for c in range(3))
+    for symmetry in symmetries
+)
+
+# The index of the symmetry that undoes each one.
+inverse_symmetry = tuple(
+    next(j for j, undo in enumerate(symmetry_cells) if all(undo[image] == cell for cell, image in enumerate(perm)))
+    for perm in symmetry_cells
+)
+
+# The image of each mask under each symmetry.
+symmetry_masks = tuple(
+    tuple(sum(1 << perm[cell] for cell in cells[mask]) for mask in range(512))
+    for perm in symmetry_cells
+)
@@ -0,0 +1,133 @@
+""" Per-move telemetry from the bots' think functions.
+
+Each think reports one record per move with report(). Records are kept only
+between start() and stop(), so a bot pays for nothing but the enabled() check
+when no one is listening. p2_sim collects the records of each game this way and
+writes them to a JSON-lines file; run this module on the file to summarize it:
+
+    python p2_sim.py mcts_vanilla mcts_modified --telemetry moves.jsonl
+    python p2_telemetry.py moves.jsonl
+
+The fields a bot fills in, where they apply to it:
+
+    wall_time       Seconds think took.
+    iterations      Games sampled by the search, or rollouts played.
+    nodes           Nodes in the search tree when the move was chosen.
+    depth           Depth of the deepest of them below the root.
+    playouts_per_s  Rollouts played per second of wall_time.
+    select, expand, rollout, backprop
+                    Seconds spent in each phase of the search.
+"""
+
+import sys
+import json
+
+FIELDS = ('wall_time', 'iterations', 'nodes', 'depth', 'playouts_per_s', 'select', 'expand', 'rollout', 'backprop')
+PHASES = ('select', 'expand', 'rollout', 'backprop')
+
+_records = None     # Records reported since start(), None when telemetry is off
+_context = {}       # Fields added to every record, such as the game and player
+
+
+def start():
+    """ Starts keeping the records the bots report. """
+    global _records
+    _records = []
+
+
+def stop():
+    """ Stops keeping records and returns those reported since start(). """
+    global _records
+    records, _records = _records or [], None
+    return records
+
+
+def enabled():
+    """ Whether records are being kept; bots can skip measuring what they would report when not. """
+    return _records is not None
+
+
+def set_context(**fields):
+    """ Sets the fields added to every record from now on, replacing the previous ones. """
+    global _context
+    _context = fields
+
+
+def report(bot: str, **fields):
+    """ Keeps a record of one move of the named bot with the given fields, if telemetry is on. """
+    if _records is not None:
+        record = dict(_context)
+        record['bot'] = bot
+        record.update(fields)
+        _records.append(record)
+
+
+def search_fields(wall_time: float, iterations: int, rollouts: int = None, phases=None):
+    """ Returns the common fields of a search: its wall time, iterations, playouts per second (one rollout
+    per iteration unless rollouts is given) and the seconds of each phase in phases, if any. """
+    rollouts = iterations if rollouts is None else rollouts
+    fields = dict(wall_time=wall_time, iterations=iterations,
+                  playouts_per_s=rollouts / wall_time if wall_time > 0 else 0.0)
+    if phases is not None:
+        fields.update(phases)
+    return fields
+
+
+def tree_shape(root_node):
+    """ Returns the number of nodes in the MCTSNode tree under root_node and the depth of the deepest. """
+    nodes = 0
+    depth = 0
+    stack = [(root_node, 0)]
+    while stack:
+        node, level = stack.pop()
+        nodes += 1
+        if level > depth:
+            depth = level
+        for child in node.children or ():
+            stack.append((child, level + 1))
+    return nodes, depth
+
+
+def write(path: str, records):
+    """ Appends the records to the JSON-lines file at path. """
+    with open(path, 'a') as telemetry_file:
+        for record in records:
+            telemetry_file.write(json.dumps(record) + '\n')
+
+
+def load(path: str):
+    """ Returns the records in the JSON-lines file at path. """
+    with open(path) as telemetry_file:
+        return [json.loads(line) for line in telemetry_file if line.strip()]
+
+
+def percentile(values, q: float):
+    """ Returns the q-th percentile of the values, interpolating between the nearest two. """
+    values = sorted(values)
+    position = (len(values) - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (position - lower)
+
+
+def summarize(records, percentiles=(50, 90, 99)):
+    """ Prints, for each player (or bot, for records without a player), the given percentiles of every field. """
+    by_player = {}
+    for record in records:
+        by_player.setdefault(record.get('player', record['bot']), []).append(record)
+
+    for player, moves in sorted(by_player.items()):
+        print("")
+        print("%s: %d moves" % (player, len(moves)))
+        print("  %-16s" % "field" + "".join("%12s" % ("p%g" % q) for q in percentiles))
+        for field in FIELDS:
+            values = [move[field] for move in moves if field in move]
+            if values:
+                print("  %-16s" % field + "".join("%12.4g" % percentile(values, q) for q in percentiles))
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        print("Need a telemetry file argument")
+        exit(1)
+    summarize([record for path in sys.argv[1:] for record in load(path)])
@@ -1,5 +1,11 @@
 from random import choice
+from time import perf_counter
+import p2_telemetry
 
 def think(board, state):
     """ Returns a random move. """
-    return choice(board.legal_actions(state))
+    start = perf_counter()
+    action = choice(board.legal_actions(state))
+    if p2_telemetry.enabled():
+        p2_telemetry.report(__name__, **p2_telemetry.search_fields(perf_counter() - start, 0))
+    return action
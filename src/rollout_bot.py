@@ -1,8 +1,13 @@
 import random
+import logging
+from time import perf_counter
+import p2_telemetry
 
 ROLLOUTS = 10
 MAX_DEPTH = 5
 
+logger = logging.getLogger(__name__)
+
 
 def think(board, state):
     """ For each possible move, this bot plays ROLLOUTS random games to depth MAX_DEPTH then averages the
@@ -15,6 +20,7 @@ def think(board, state):
     Returns:    The action with the maximal score given the rollouts.
 
     """
+    start = perf_counter()
     moves = board.legal_actions(state)
 
     best_move = moves[0]
@@ -38,14 +44,8 @@ def think(board, state):
 
         # Sample a set number of games where the target move is immediately applied.
         for r in range(ROLLOUTS):
-            rollout_state = board.next_state(state, move)
-
             # Only play to the specified depth.
-            for i in range(MAX_DEPTH):
-                if board.is_ended(rollout_state):
-                    break
-                rollout_move = random.choice(board.legal_actions(rollout_state))
-                rollout_state = board.next_state(rollout_state, rollout_move)
+            rollout_state = board.random_playout(board.next_state(state, move), random, MAX_DEPTH)
 
             total_score += outcome(board.owned_boxes(rollout_state),
                                    board.points_values(rollout_state))
@@ -57,5 +57,8 @@ def think(board, state):
             best_expectation = expectation
             best_move = move
 
-    print("Rollout bot picking %s with expected score %f" % (str(best_move), best_expectation))
+    logger.info("Rollout bot picking %s with expected score %f", best_move, best_expectation)
+    if p2_telemetry.enabled():
+        wall_time = perf_counter() - start
+        p2_telemetry.report(__name__, **p2_telemetry.search_fields(wall_time, len(moves) * ROLLOUTS))
     return best_move
@@ -0,0 +1,47 @@
+import random
+import pytest
+import p2_t3
+import mcts_vanilla
+import mcts_parallel
+
+
+def midgame_state(board):
+    """ A position 20 random moves in, where one of the legal moves captures a sub-board, so
+    'priority' expansion moves it ahead of the legal_actions order at the root. """
+    return board.random_playout(board.starting_state(), random.Random(4), 20)
+
+
+def tree_stats(node):
+    """ The action, wins and visits of node and of every node below it, in the order they were expanded. """
+    return node.parent_action, node.wins, node.visits, [tree_stats(child) for child in node.children or ()]
+
+
+@pytest.mark.parametrize('expansion_order', ['fixed', 'random', 'priority'])
+@pytest.mark.parametrize('expand_all', [False, True])
+def test_one_thread_matches_serial(monkeypatch, expansion_order, expand_all):
+    monkeypatch.setattr(mcts_vanilla, 'expansion_order', expansion_order)
+    monkeypatch.setattr(mcts_vanilla, 'expand_all', expand_all)
+    board = p2_t3.Board()
+    state = midgame_state(board)
+    random.seed(0)
+    serial, _ = mcts_vanilla.search(board, state, 500)
+    random.seed(0)
+    shared = mcts_parallel.tree_parallel('mcts_vanilla', board, state, 500, 1)
+    assert tree_stats(shared) == tree_stats(serial)
+
+
+def test_threads_share_every_iteration():
+    board = p2_t3.Board()
+    root = mcts_parallel.tree_parallel('mcts_vanilla', board, board.starting_state(), 200, 4)
+    assert root.visits == 200
+    assert sum(child.visits for child in root.children) == 200
+
+
+def test_worker_error_is_raised(monkeypatch):
+    def rollout(board, state):
+        raise RuntimeError("rollout failed")
+
+    monkeypatch.setattr(mcts_vanilla, 'rollout', rollout)
+    board = p2_t3.Board()
+    with pytest.raises(RuntimeError, match="rollout failed"):
+        mcts_parallel.tree_parallel('mcts_vanilla', board, board.starting_state(), 100, 3)
@@ -0,0 +1,26 @@
+import random
+import pytest
+import p2_t3
+import mcts_vanilla
+import mcts_modified
+from mcts_profile import Profiler
+from p2_telemetry import PHASES
+
+
+def tree_stats(node):
+    """ The action, wins and visits of node and of every node below it, in the order they were expanded. """
+    return node.parent_action, node.wins, node.visits, [tree_stats(child) for child in node.children or ()]
+
+
+@pytest.mark.parametrize('module', [mcts_vanilla, mcts_modified])
+def test_profiled_search_builds_the_same_tree(module):
+    board = p2_t3.Board()
+    state = board.starting_state()
+    random.seed(0)
+    plain, _ = module.search(board, state, 300)
+    profiler = Profiler()
+    random.seed(0)
+    profiled, _ = module.search(board, state, 300, profiler=profiler)
+    assert tree_stats(profiled) == tree_stats(plain)
+    assert all(profiler.calls[phase] == 300 for phase in PHASES)
+    assert all(profiler.nanoseconds[phase] > 0 for phase in PHASES)
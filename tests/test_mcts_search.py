@@ -0,0 +1,47 @@
+import pytest
+import p2_t3
+import mcts_vanilla
+import mcts_modified
+import mcts_pool
+import mcts_transposition
+
+
+@pytest.mark.parametrize('think', [mcts_vanilla.think, mcts_modified.think, mcts_pool.think,
+                                   mcts_transposition.think, mcts_vanilla.SearchSession().think])
+def test_tiny_time_budget_still_moves(think):
+    board = p2_t3.Board()
+    state = board.starting_state()
+    assert think(board, state, time_budget=1e-9) in board.legal_actions(state)
+
+
+@pytest.mark.parametrize('search', [mcts_vanilla.search, mcts_modified.search, mcts_pool.search,
+                                    mcts_transposition.search])
+def test_tiny_time_budget_runs_one_iteration(search):
+    board = p2_t3.Board()
+    assert search(board, board.starting_state(), time_budget=1e-9)[-1] == 1
+
+
+@pytest.mark.parametrize('search', [mcts_vanilla.search, mcts_modified.search, mcts_pool.search,
+                                    mcts_transposition.search])
+def test_node_budget_runs_that_many_iterations(search):
+    board = p2_t3.Board()
+    assert search(board, board.starting_state(), node_budget=37)[-1] == 37
+
+
+@pytest.mark.parametrize('prior_visits', [1, 3])
+def test_expand_all_gives_every_child_its_prior(monkeypatch, prior_visits):
+    monkeypatch.setattr(mcts_vanilla, 'expand_all', True)
+    monkeypatch.setattr(mcts_vanilla, 'prior_visits', prior_visits)
+    board = p2_t3.Board()
+    state = board.starting_state()
+    root, _ = mcts_vanilla.search(board, state, 1)
+    assert len(root.children) == len(board.legal_actions(state))
+    assert sum(child.visits for child in root.children) == prior_visits * len(root.children) + 1
+
+
+def test_expand_all_rejects_zero_prior_visits(monkeypatch):
+    monkeypatch.setattr(mcts_vanilla, 'expand_all', True)
+    monkeypatch.setattr(mcts_vanilla, 'prior_visits', 0)
+    board = p2_t3.Board()
+    with pytest.raises(ValueError, match="prior_visits"):
+        mcts_vanilla.search(board, board.starting_state(), 10)
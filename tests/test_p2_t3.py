@@ -0,0 +1,84 @@
+import random
+import pytest
+import p2_t3
+
+
+def random_game(board, seed: int):
+    """ Every state of a game of random moves, seeded with seed, from the start to the end. """
+    rng = random.Random(seed)
+    state = board.starting_state()
+    states = [state]
+    while not board.is_ended(state):
+        state = board.next_state(state, rng.choice(board.legal_actions(state)))
+        states.append(state)
+    return states
+
+
+def comprehension_legal_actions(state):
+    """ The legal actions of a tuple state as Board.legal_actions listed them before the free-cell tables. """
+    R, C = state[20], state[21]
+    Rset, Cset = ((R,), (C,)) if R is not None else (range(3), range(3))
+    occupied = [state[2 * x] | state[2 * x + 1] for x in range(9)]
+    finished = state[18] | state[19]
+    return [(R, C, r, c) for R in Rset for C in Cset for r in range(3) for c in range(3)
+            if not occupied[3 * R + C] & p2_t3.positions[(r, c)] and not finished & p2_t3.positions[(R, C)]]
+
+
+@pytest.mark.parametrize('seed', range(50))
+def test_packed_board_plays_the_same_game(seed):
+    board, packed = p2_t3.Board(), p2_t3.PackedBoard()
+    rng = random.Random(seed)
+    state, packed_state = board.starting_state(), packed.starting_state()
+    while True:
+        actions = board.legal_actions(state)
+        assert actions == comprehension_legal_actions(state)
+        assert packed.legal_actions(packed_state) == actions
+        assert p2_t3.decode_state(packed_state) == state
+        assert packed.is_ended(packed_state) == board.is_ended(state)
+        assert packed.win_values(packed_state) == board.win_values(state)
+        assert packed.points_values(packed_state) == board.points_values(state)
+        for candidate, candidate_state in ((board, state), (packed, packed_state)):
+            mask = candidate.legal_mask(candidate_state)
+            assert [p2_t3.actions[i] for i in range(81) if mask >> i & 1] == sorted(actions)
+        if board.is_ended(state):
+            break
+        action = rng.choice(actions)
+        state, packed_state = board.next_state(state, action), packed.next_state(packed_state, action)
+
+
+@pytest.mark.parametrize('seed', range(50))
+def test_incremental_zobrist_key_matches_from_scratch(seed):
+    board = p2_t3.PackedBoard()
+    for state in random_game(board, seed):
+        assert board.hash(state) == p2_t3.zobrist_key(p2_t3.decode_state(state))
+
+
+@pytest.mark.parametrize('seed', range(50))
+def test_encode_decode_round_trip(seed):
+    board = p2_t3.PackedBoard()
+    for state in random_game(board, seed):
+        decoded = p2_t3.decode_state(state)
+        assert p2_t3.encode_state(decoded) == state
+        assert p2_t3.Board().hash(decoded) == board.hash(state)
+
+
+@pytest.mark.parametrize('board', [p2_t3.Board(), p2_t3.PackedBoard()], ids=['Board', 'PackedBoard'])
+@pytest.mark.parametrize('seed', range(10))
+def test_canonical_is_shared_by_every_symmetry(board, seed):
+    for state in random_game(board, seed):
+        canonical_state, symmetry = board.canonical(state)
+        assert board.transform(state, symmetry) == canonical_state
+        for other in range(8):
+            assert board.canonical(board.transform(state, other))[0] == canonical_state
+
+
+@pytest.mark.parametrize('board', [p2_t3.Board(), p2_t3.PackedBoard()], ids=['Board', 'PackedBoard'])
+@pytest.mark.parametrize('seed', range(10))
+def test_transformed_actions_commute_with_moves(board, seed):
+    for state in random_game(board, seed)[:-1]:
+        canonical_state, symmetry = board.canonical(state)
+        for action in board.legal_actions(state):
+            image = board.transform_action(action, symmetry)
+            assert board.untransform_action(image, symmetry) == action
+            assert board.transform(board.next_state(state, action), symmetry) == \
+                board.next_state(canonical_state, image)